@@ -0,0 +1,105 @@
+# backend/benchmarks/bench_workers.py
+#
+# Measures requests/sec of the API as the number of uvicorn worker processes
+# grows. Run from the backend directory on a multi-core host:
+#
+#   python benchmarks/bench_workers.py --workers 1 2 4 8 --clients 32
+#
+# Each run starts a fresh server on temporary databases, registers a few
+# functions, then hammers one endpoint from several client processes using
+# keep-alive connections.
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = "127.0.0.1"
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(HOST, port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def seed_functions(port, count):
+    conn = http.client.HTTPConnection(HOST, port)
+    for i in range(count):
+        body = json.dumps({"name": f"bench-fn-{i}", "route": f"/bench/{i}", "language": "python"})
+        conn.request("POST", "/functions/register", body, {"Content-Type": "application/json"})
+        conn.getresponse().read()
+
+
+def client_loop(args):
+    port, path, duration = args
+    conn = http.client.HTTPConnection(HOST, port)
+    done = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            done += 1
+    return done
+
+
+def run_benchmark(workers, clients, duration, path, port, seed):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'functions.db')}"
+        env["METRICS_DB_PATH"] = os.path.join(tmpdir, "metrics.db")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app",
+             "--host", HOST, "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            wait_until_ready(port)
+            seed_functions(port, seed)
+            with multiprocessing.Pool(clients) as pool:
+                start = time.time()
+                counts = pool.map(client_loop, [(port, path, duration)] * clients)
+                elapsed = time.time() - start
+            return sum(counts) / elapsed
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API throughput vs. worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=multiprocessing.cpu_count() * 2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--path", default="/functions/list")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=50, help="functions to register before measuring")
+    args = parser.parse_args()
+
+    print(f"cpus={multiprocessing.cpu_count()} clients={args.clients} path={args.path}")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        rps = run_benchmark(workers, args.clients, args.duration, args.path, args.port, args.seed)
+        baseline = baseline or rps
+        print(f"{workers:>8} {rps:>10.1f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
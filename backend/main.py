@@ -1,7 +1,13 @@
+import os
 from fastapi import FastAPI
-from routes.function_routes import router as function_router 
+from routes.function_routes import router as function_router
+from routes.trigger_routes import router as trigger_router
+from models.database import init_schema
 from utils.container_pool import start_warm_containers
 from utils.metrics_db import init_db
+from utils.metrics_retention import start_retention_worker
+from utils.process_lock import process_lock
+from utils.triggers import start_trigger_scheduler
 import sqlite3
 from pydantic import BaseModel
 
@@ -9,16 +15,22 @@ app = FastAPI()
 
 @app.on_event("startup")
 def warm_up():
-    init_db()  
-    start_warm_containers()  
+    with process_lock("schema"):
+        init_schema()
+        init_db()
+    start_warm_containers()
+    start_retention_worker()
+    start_trigger_scheduler()
 
 @app.get("/")
 def read_root():
     return {"message": "Lambda Function API is running!"}
 
 app.include_router(function_router, prefix="/functions")
+app.include_router(trigger_router, prefix="/triggers")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
+    # State is kept in the databases, so any number of workers is safe,
+    # e.g. WORKERS=4 python main.py (or gunicorn -k uvicorn.workers.UvicornWorker -w 4 main:app)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WORKERS", "1")))
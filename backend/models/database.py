@@ -1,14 +1,69 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///functions.db")
+
 # Create Database Engine
-engine = create_engine("sqlite:///functions.db")
+# Every worker process builds its own engine (and connection pool) on import,
+# so nothing is shared between processes except the database itself.
+if DATABASE_URL.startswith("sqlite"):
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_pre_ping=True,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers in other workers proceed while one worker writes
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_pre_ping=True,
+    )
 
 # Define Base
 Base = declarative_base()
 
-# Create Session
-Session = sessionmaker(bind=engine)
-session = Session()
+# Session factory; use one session per request via get_db()
+Session = sessionmaker(bind=engine, autoflush=False)
+
+
+def get_db():
+    db = Session()
+    try:
+        yield db
+    finally:
+        db.close()
+
 
+def init_schema():
+    # create_all() never alters existing tables, so add any columns and
+    # indexes that were introduced after a table was first created.
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                # Existing rows get the value new rows would have been given
+                if column.default is not None and column.default.is_scalar:
+                    conn.execute(
+                        text(f"UPDATE {table.name} SET {column.name} = :value WHERE {column.name} IS NULL"),
+                        {"value": column.default.arg}
+                    )
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
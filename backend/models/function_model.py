@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Text
 from .database import Base  # Ensure the correct import
 
 class FunctionMetadata(Base):
@@ -6,7 +6,23 @@ class FunctionMetadata(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True)
-    route = Column(String)
-    language = Column(String)
+    route = Column(String, index=True)
+    language = Column(String, index=True)
     timeout = Column(Integer)
+    runtime = Column(String, index=True, default="docker")
+    code = Column(Text)  # source run by triggers
+    latency_target_ms = Column(Integer)  # goal for the "auto" runtime
 
+    def to_dict(self, include_code=False):
+        # Source can be large; listings leave it out
+        data = {
+            "name": self.name,
+            "route": self.route,
+            "language": self.language,
+            "timeout": self.timeout,
+            "runtime": self.runtime,
+            "latency_target_ms": self.latency_target_ms,
+        }
+        if include_code:
+            data["code"] = self.code
+        return data
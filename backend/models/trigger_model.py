@@ -0,0 +1,46 @@
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text
+from .database import Base
+
+class TriggerConfig(Base):
+    __tablename__ = "triggers"
+
+    id = Column(Integer, primary_key=True)
+    function_name = Column(String, index=True)
+    kind = Column(String)  # schedule, directory or queue
+    schedule = Column(String)  # cron expression for schedule triggers
+    path = Column(String)  # watched directory for directory triggers
+    batch_size = Column(Integer, default=10)
+    max_parallelism = Column(Integer, default=2)
+    runtime = Column(String)  # overrides the function's runtime if set
+    enabled = Column(Boolean, default=True)
+    last_fired_at = Column(DateTime)
+    # Invocations in flight, kept here so every worker process sees them
+    running = Column(Integer, default=0)
+    running_since = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "function_name": self.function_name,
+            "kind": self.kind,
+            "schedule": self.schedule,
+            "path": self.path,
+            "batch_size": self.batch_size,
+            "max_parallelism": self.max_parallelism,
+            "runtime": self.runtime,
+            "enabled": self.enabled,
+            "last_fired_at": self.last_fired_at.isoformat() if self.last_fired_at else None,
+            "running": self.running or 0,
+        }
+
+class QueuedEvent(Base):
+    __tablename__ = "event_queue"
+
+    id = Column(Integer, primary_key=True)
+    function_name = Column(String, index=True)
+    payload = Column(Text)  # JSON document
+    status = Column(String, default="pending", index=True)  # pending, claimed or failed
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime)
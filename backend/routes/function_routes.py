@@ -1,100 +1,269 @@
-from fastapi import APIRouter, HTTPException
-from utils.execution_engine import run_in_warm_container, run_with_runtime
-from utils.metrics_db import store_metrics, get_aggregated_metrics
+import asyncio
+import threading
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models.database import Session as SessionLocal, get_db
+from models.function_model import FunctionMetadata as FunctionRecord
+from models.trigger_model import QueuedEvent, TriggerConfig
+from utils.execution_engine import RUNTIME_MODES, run_function
+from utils.runtime_selector import choose_runtime
+from utils.container_pool import WARM_CONTAINERS
+from utils.metrics_db import get_aggregated_metrics, get_metrics_since, get_storage_stats
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import List, Optional
+from collections import Counter
 
 router = APIRouter()
 
-# In-memory database to simulate function metadata
-function_registry: Dict[str, dict] = {}
+# Function metadata lives in the shared database (see models/) so every
+# worker process sees the same registry.
 
 class FunctionExecRequest(BaseModel):
     functionCode: str
     language: str
-    runtime: str = "docker"
+    runtime: str = "docker"  # docker, docker-warm, gvisor or auto
+    # Registered function to run as; its timeout applies to this execution
+    name: Optional[str] = None
 
 class FunctionMetadata(BaseModel):
     name: str
     route: str
     language: str
     timeout: Optional[int] = 10
+    runtime: Optional[str] = "docker"
+    # Source run when the function is invoked by a trigger
+    code: Optional[str] = None
+    # p95 latency the "auto" runtime tries to stay under
+    latency_target_ms: Optional[int] = None
+
+class BulkDeleteRequest(BaseModel):
+    names: List[str]
+
+# Upper bound on items in one bulk request (one transaction)
+MAX_BULK_ITEMS = 1000
+
+def _delete_attachments(db: Session, names: List[str]):
+    # Triggers and queued events die with their function
+    db.query(TriggerConfig).filter(TriggerConfig.function_name.in_(names)).delete(synchronize_session=False)
+    db.query(QueuedEvent).filter(QueuedEvent.function_name.in_(names)).delete(synchronize_session=False)
+
+def _check_runtime(metas: List[FunctionMetadata]):
+    invalid = sorted({meta.runtime for meta in metas if meta.runtime and meta.runtime not in RUNTIME_MODES})
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Unsupported runtime specified: {invalid}")
+
+def _get_record(db: Session, name: str) -> FunctionRecord:
+    record = db.query(FunctionRecord).filter(FunctionRecord.name == name).first()
+    if record is None:
+        raise HTTPException(status_code=404, detail="Function not found.")
+    return record
 
 # --- Execution Endpoint ---
+# How often a running execution checks whether the client went away
+DISCONNECT_POLL_SECONDS = 0.5
+
+def _run_execution(req: FunctionExecRequest, language: str, runtime: str, cancel_event: threading.Event):
+    # Ad-hoc code (no name) runs with the engine's default timeouts
+    function_name, timeout, latency_target_ms = "unknown", None, None
+    if req.name:
+        db = SessionLocal()
+        try:
+            record = _get_record(db, req.name)
+            function_name = record.name
+            timeout = record.timeout
+            latency_target_ms = record.latency_target_ms
+        finally:
+            # Release the pooled connection before the (slow) container run
+            db.close()
+
+    return run_function(function_name, language, req.functionCode, runtime,
+                        timeout=timeout, cancel_event=cancel_event,
+                        latency_target_ms=latency_target_ms)
+
 @router.post("/execute")
-def execute_function(req: FunctionExecRequest):
-    code = req.functionCode
+async def execute_function(req: FunctionExecRequest, request: Request):
     language = req.language.lower()
     runtime = req.runtime.lower()
 
-    if not code:
+    if not req.functionCode:
         raise HTTPException(status_code=400, detail="Function code is required.")
-
-    function_name = "unknown"
-    # Try to match a registered function name
-    for name, meta in function_registry.items():
-        if meta["language"] == language:
-            function_name = name
-            break
-
-    # Warm container
-    if runtime == "docker-warm":
-        result = run_in_warm_container("warm-python-fn", language, code)
-        store_metrics(function_name, result["metrics"])
-        return result
-
-    # gVisor simulation with runc (since WSL2 doesn't support runsc)
-    elif runtime == "gvisor":
-        result = run_with_runtime("python-lambda-runtime", language, code, runtime="runc")
-        store_metrics(function_name, result["metrics"])
-        return result
-
-    # Cold Docker (default)
-    elif runtime == "docker":
-        result = run_with_runtime("python-lambda-runtime", language, code, runtime="runc")
-        store_metrics(function_name, result["metrics"])
-        return result
-
-    else:
+    if runtime not in RUNTIME_MODES:
         raise HTTPException(status_code=400, detail="Unsupported runtime specified.")
 
+    # Run in the threadpool and keep watching the client; if it disconnects,
+    # the engine kills the sandboxed process instead of letting it run on.
+    cancel_event = threading.Event()
+    task = asyncio.ensure_future(run_in_threadpool(_run_execution, req, language, runtime, cancel_event))
+    while not task.done():
+        await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if not task.done() and await request.is_disconnected():
+            cancel_event.set()
+    return task.result()
+
 # --- Register Function ---
 @router.post("/register")
-def register_function(meta: FunctionMetadata):
-    if meta.name in function_registry:
+def register_function(meta: FunctionMetadata, db: Session = Depends(get_db)):
+    _check_runtime([meta])
+    if db.query(FunctionRecord.id).filter(FunctionRecord.name == meta.name).first():
+        raise HTTPException(status_code=400, detail="Function already exists.")
+    db.add(FunctionRecord(**meta.dict()))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker registered the same name concurrently
+        db.rollback()
         raise HTTPException(status_code=400, detail="Function already exists.")
-    function_registry[meta.name] = meta.dict()
     return {"message": f"Function '{meta.name}' registered successfully."}
 
+# --- Bulk Register / Update / Delete ---
+# Each bulk call runs in a single transaction: either every item is
+# applied or, if any item is rejected, none are.
+def _check_bulk_names(names: List[str]):
+    if not names:
+        raise HTTPException(status_code=400, detail="At least one function is required.")
+    if len(names) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ITEMS} functions per request.")
+    duplicates = sorted(name for name, count in Counter(names).items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate names in request: {duplicates}")
+
+def _records_by_name(db: Session, names: List[str]):
+    records = db.query(FunctionRecord).filter(FunctionRecord.name.in_(names)).all()
+    return {record.name: record for record in records}
+
+def _missing_names(names: List[str], records: dict):
+    missing = [name for name in names if name not in records]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Functions not found: {missing}")
+
+@router.post("/bulk/register")
+def bulk_register_functions(metas: List[FunctionMetadata], db: Session = Depends(get_db)):
+    names = [meta.name for meta in metas]
+    _check_bulk_names(names)
+    _check_runtime(metas)
+    existing = sorted(_records_by_name(db, names))
+    if existing:
+        raise HTTPException(status_code=400, detail=f"Functions already exist: {existing}")
+    db.add_all([FunctionRecord(**meta.dict()) for meta in metas])
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="One or more functions already exist.")
+    return {"message": f"Registered {len(metas)} functions.", "names": names}
+
+@router.put("/bulk/update")
+def bulk_update_functions(metas: List[FunctionMetadata], db: Session = Depends(get_db)):
+    names = [meta.name for meta in metas]
+    _check_bulk_names(names)
+    _check_runtime(metas)
+    records = _records_by_name(db, names)
+    _missing_names(names, records)
+    for meta in metas:
+        # Fields left out of the request keep their stored values
+        for field, value in meta.dict(exclude_unset=True).items():
+            setattr(records[meta.name], field, value)
+    db.commit()
+    return {"message": f"Updated {len(metas)} functions.", "names": names}
+
+@router.post("/bulk/delete")
+def bulk_delete_functions(req: BulkDeleteRequest, db: Session = Depends(get_db)):
+    _check_bulk_names(req.names)
+    records = _records_by_name(db, req.names)
+    _missing_names(req.names, records)
+    db.query(FunctionRecord).filter(FunctionRecord.name.in_(req.names)).delete(synchronize_session=False)
+    _delete_attachments(db, req.names)
+    db.commit()
+    return {"message": f"Deleted {len(req.names)} functions.", "names": req.names}
+
 # --- Get Function Metadata ---
 @router.get("/get/{name}")
-def get_function(name: str):
-    if name not in function_registry:
-        raise HTTPException(status_code=404, detail="Function not found.")
-    return function_registry[name]
+def get_function(name: str, db: Session = Depends(get_db)):
+    return _get_record(db, name).to_dict(include_code=True)
 
 # --- List All Functions ---
 @router.get("/list")
-def list_functions():
-    return function_registry
+def list_functions(db: Session = Depends(get_db)):
+    records = db.query(FunctionRecord).order_by(FunctionRecord.id).all()
+    return {record.name: record.to_dict() for record in records}
+
+# --- Paginated, Filtered Listing ---
+# Keyset pagination on the unique name index: pass back next_cursor to get
+# the following page, so each page costs the same however large the
+# registry grows.
+@router.get("/search")
+def search_functions(
+    language: Optional[str] = None,
+    route_prefix: Optional[str] = None,
+    runtime: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    query = db.query(FunctionRecord)
+    if language:
+        query = query.filter(FunctionRecord.language == language)
+    if route_prefix:
+        query = query.filter(FunctionRecord.route.startswith(route_prefix, autoescape=True))
+    if runtime:
+        query = query.filter(FunctionRecord.runtime == runtime)
+    if cursor:
+        query = query.filter(FunctionRecord.name > cursor)
+    records = query.order_by(FunctionRecord.name).limit(limit + 1).all()
+    page = records[:limit]
+    return {
+        "items": [record.to_dict() for record in page],
+        "next_cursor": page[-1].name if len(records) > limit else None
+    }
 
 # --- Update Function ---
 @router.put("/update/{name}")
-def update_function(name: str, meta: FunctionMetadata):
-    if name not in function_registry:
-        raise HTTPException(status_code=404, detail="Function not found.")
-    function_registry[name] = meta.dict()
+def update_function(name: str, meta: FunctionMetadata, db: Session = Depends(get_db)):
+    _check_runtime([meta])
+    record = _get_record(db, name)
+    # Fields left out of the request keep their stored values
+    for field, value in meta.dict(exclude_unset=True).items():
+        setattr(record, field, value)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Function already exists.")
     return {"message": f"Function '{name}' updated."}
 
 # --- Delete Function ---
 @router.delete("/delete/{name}")
-def delete_function(name: str):
-    if name not in function_registry:
-        raise HTTPException(status_code=404, detail="Function not found.")
-    del function_registry[name]
+def delete_function(name: str, db: Session = Depends(get_db)):
+    db.delete(_get_record(db, name))
+    _delete_attachments(db, [name])
+    db.commit()
     return {"message": f"Function '{name}' deleted successfully."}
-    
+
 
 @router.get("/metrics/{name}")
 def get_metrics(name: str):
     return get_aggregated_metrics(name)
+
+# --- Incremental Metrics ---
+# Without a cursor this returns the newest points; poll with the returned
+# cursor to receive only points recorded since then.
+@router.get("/metrics/{name}/points")
+def get_metric_points(name: str, cursor: Optional[int] = Query(None, ge=0), limit: int = Query(500, ge=1, le=5000)):
+    return get_metrics_since(name, cursor, limit)
+
+# --- Per-Runtime Performance ---
+# Recent history per runtime and what the "auto" policy would pick now.
+@router.get("/metrics/{name}/runtimes")
+def get_runtime_metrics(name: str, db: Session = Depends(get_db)):
+    record = _get_record(db, name)
+    runtime, decision = choose_runtime(
+        name, WARM_CONTAINERS.get(record.language, "warm-python-fn"), record.latency_target_ms
+    )
+    return {"runtimes": decision["candidates"], "auto_choice": runtime, "decision": decision}
+
+# --- Metrics Store Size ---
+@router.get("/storage/metrics")
+def get_metrics_storage():
+    return get_storage_stats()
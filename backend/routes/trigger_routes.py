@@ -0,0 +1,96 @@
+import json
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+from models.database import get_db
+from models.function_model import FunctionMetadata as FunctionRecord
+from models.trigger_model import QueuedEvent, TriggerConfig
+from utils.cron import parse_cron
+from utils.execution_engine import RUNTIME_MODES
+from utils.triggers import TRIGGER_WATCH_ROOT, resolve_watch_path
+from typing import Any, List, Optional
+
+router = APIRouter()
+
+TRIGGER_KINDS = ("schedule", "directory", "queue")
+
+class TriggerRequest(BaseModel):
+    kind: str
+    schedule: Optional[str] = None
+    path: Optional[str] = None
+    batch_size: int = Field(10, ge=1, le=1000)
+    max_parallelism: int = Field(2, ge=1, le=32)
+    runtime: Optional[str] = None
+    enabled: bool = True
+
+class EnqueueRequest(BaseModel):
+    events: List[Any]
+
+def _get_function(db: Session, name: str) -> FunctionRecord:
+    record = db.query(FunctionRecord).filter(FunctionRecord.name == name).first()
+    if record is None:
+        raise HTTPException(status_code=404, detail="Function not found.")
+    return record
+
+def _validate(req: TriggerRequest):
+    if req.kind not in TRIGGER_KINDS:
+        raise HTTPException(status_code=400, detail=f"Trigger kind must be one of {list(TRIGGER_KINDS)}.")
+    if req.runtime and req.runtime not in RUNTIME_MODES:
+        raise HTTPException(status_code=400, detail="Unsupported runtime specified.")
+    if req.kind == "schedule":
+        try:
+            parse_cron(req.schedule or "")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if req.kind == "directory":
+        # Stored resolved, so the scheduler watches exactly what was checked
+        req.path = resolve_watch_path(req.path) if req.path else None
+        if not (req.path and os.path.isdir(req.path)):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Directory triggers need an existing directory under {TRIGGER_WATCH_ROOT}."
+            )
+
+# --- Attach Trigger ---
+@router.post("/{function_name}")
+def create_trigger(function_name: str, req: TriggerRequest, db: Session = Depends(get_db)):
+    function = _get_function(db, function_name)
+    if not function.code:
+        raise HTTPException(status_code=400, detail="Register the function with code before adding triggers.")
+    _validate(req)
+    trigger = TriggerConfig(function_name=function_name, **req.dict())
+    db.add(trigger)
+    db.commit()
+    return trigger.to_dict()
+
+# --- List Triggers ---
+@router.get("/{function_name}")
+def list_triggers(function_name: str, db: Session = Depends(get_db)):
+    triggers = db.query(TriggerConfig).filter(TriggerConfig.function_name == function_name).order_by(TriggerConfig.id)
+    return [trigger.to_dict() for trigger in triggers]
+
+# --- Delete Trigger ---
+@router.delete("/delete/{trigger_id}")
+def delete_trigger(trigger_id: int, db: Session = Depends(get_db)):
+    trigger = db.get(TriggerConfig, trigger_id)
+    if trigger is None:
+        raise HTTPException(status_code=404, detail="Trigger not found.")
+    db.delete(trigger)
+    db.commit()
+    return {"message": f"Trigger {trigger_id} deleted."}
+
+# --- Enqueue Events ---
+# Queue triggers on the function pick these up in batches.
+@router.post("/{function_name}/events")
+def enqueue_events(function_name: str, req: EnqueueRequest, db: Session = Depends(get_db)):
+    _get_function(db, function_name)
+    db.add_all([
+        QueuedEvent(function_name=function_name, payload=json.dumps(event))
+        for event in req.events
+    ])
+    db.commit()
+    pending = db.query(QueuedEvent).filter(
+        QueuedEvent.function_name == function_name, QueuedEvent.status == "pending"
+    ).count()
+    return {"message": f"Queued {len(req.events)} events.", "pending": pending}
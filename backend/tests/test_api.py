@@ -1,4 +1,5 @@
 import requests
+import uuid
 
 BASE_URL = "http://127.0.0.1:8000"
 
@@ -15,3 +16,47 @@ def test_execute_function():
     assert "stdout" in data
     assert data["stdout"].strip() == "Lambda Execution Works!"
 
+
+def test_register_list_and_delete_function():
+    name = f"test-fn-{uuid.uuid4().hex[:8]}"
+    meta = {"name": name, "route": f"/{name}", "language": "python", "timeout": 5, "runtime": "docker"}
+
+    response = requests.post(f"{BASE_URL}/functions/register", json=meta)
+    assert response.status_code == 200
+    # A second registration is rejected no matter which worker serves it
+    assert requests.post(f"{BASE_URL}/functions/register", json=meta).status_code == 400
+
+    listed = requests.get(f"{BASE_URL}/functions/list").json()
+    assert {key: listed[name][key] for key in meta} == meta
+
+    assert requests.delete(f"{BASE_URL}/functions/delete/{name}").status_code == 200
+    assert requests.get(f"{BASE_URL}/functions/get/{name}").status_code == 404
+
+
+def test_bulk_register_and_paginated_search():
+    prefix = f"/bulk-{uuid.uuid4().hex[:8]}"
+    metas = [
+        {"name": f"{prefix[1:]}-{i}", "route": f"{prefix}/{i}", "language": "python", "timeout": 5, "runtime": "docker"}
+        for i in range(5)
+    ]
+    assert requests.post(f"{BASE_URL}/functions/bulk/register", json=metas).status_code == 200
+    # One existing name rejects the whole batch
+    retry = metas[:1] + [dict(metas[0], name=f"{prefix[1:]}-new")]
+    assert requests.post(f"{BASE_URL}/functions/bulk/register", json=retry).status_code == 400
+    assert requests.get(f"{BASE_URL}/functions/get/{prefix[1:]}-new").status_code == 404
+
+    names, cursor = [], None
+    while True:
+        params = {"route_prefix": prefix, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = requests.get(f"{BASE_URL}/functions/search", params=params).json()
+        names += [item["name"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert names == sorted(meta["name"] for meta in metas)
+
+    response = requests.post(f"{BASE_URL}/functions/bulk/delete", json={"names": names})
+    assert response.status_code == 200
+    assert requests.get(f"{BASE_URL}/functions/search", params={"route_prefix": prefix}).json()["items"] == []
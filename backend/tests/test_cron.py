@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+
+from utils.cron import cron_matches, parse_cron
+
+
+def test_every_five_minutes():
+    assert cron_matches("*/5 * * * *", datetime(2025, 4, 1, 12, 10))
+    assert not cron_matches("*/5 * * * *", datetime(2025, 4, 1, 12, 11))
+
+
+def test_ranges_lists_and_steps():
+    expression = "0 9-17/4 * * 1,3"
+    # 2025-04-02 is a Wednesday
+    assert cron_matches(expression, datetime(2025, 4, 2, 13, 0))
+    assert not cron_matches(expression, datetime(2025, 4, 2, 14, 0))
+    assert not cron_matches(expression, datetime(2025, 4, 3, 13, 0))
+
+
+def test_sunday_is_zero_or_seven():
+    sunday = datetime(2025, 4, 6, 0, 0)
+    assert cron_matches("0 0 * * 0", sunday)
+    assert cron_matches("0 0 * * 7", sunday)
+
+
+def test_restricted_day_fields_match_either():
+    # 1st of the month or any Monday; 2025-04-07 is a Monday
+    assert cron_matches("0 0 1 * 1", datetime(2025, 4, 7, 0, 0))
+    assert cron_matches("0 0 1 * 1", datetime(2025, 4, 1, 0, 0))
+    assert not cron_matches("0 0 1 * 1", datetime(2025, 4, 2, 0, 0))
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *", "a * * * *"])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        parse_cron(expression)
@@ -0,0 +1,223 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import container_pool, execution_engine, process_lock
+from utils.execution_engine import _run_cancellable, _status
+
+# Stands in for the docker CLI: logs every call and runs exec'd commands on
+# the host, so the scripts meant for the sandbox really run. `docker run`
+# hangs like a function stuck past its timeout.
+FAKE_DOCKER = r"""#!/bin/sh
+echo "$*" >> "$FAKE_DOCKER_LOG"
+case "$1" in
+  exec)
+    shift
+    while [ $# -gt 0 ]; do
+      case "$1" in
+        -i) shift ;;
+        -e) export "$2"; shift 2 ;;
+        *) break ;;
+      esac
+    done
+    shift
+    if [ -n "$FAKE_DOCKER_EXEC_DELAY" ] && [ $# -gt 3 ]; then
+      # Like the daemon, start the job even if the CLI is killed meanwhile
+      setsid sh -c 'sleep "$0"; exec "$@"' "$FAKE_DOCKER_EXEC_DELAY" "$@" &
+      wait $!
+      exit $?
+    fi
+    exec "$@" ;;
+  run)
+    exec sleep 30 ;;
+esac
+"""
+
+
+def process_alive(pid):
+    # Killed processes may linger as zombies until reaped; those are gone too
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def sandbox_like_command(pid_file):
+    # A parent with a background child, like a function that forks workers
+    return ["sh", "-c", f"sleep 30 & echo $! >> {pid_file}; sleep 30"]
+
+
+def test_completed_command_returns_output():
+    returncode, stdout, stderr, aborted = _run_cancellable(["sh", "-c", "echo hi"], 5)
+    assert (returncode, stdout.strip(), aborted) == (0, "hi", None)
+
+
+def test_timeout_storm_leaves_no_orphans(tmp_path):
+    pid_file = tmp_path / "children.pid"
+    aborts = []
+
+    def run_one(_):
+        return _run_cancellable(sandbox_like_command(pid_file), 0.3, on_abort=lambda: aborts.append(1))
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=25) as pool:
+        results = list(pool.map(run_one, range(50)))
+    assert time.monotonic() - start < 10
+
+    assert [r[3] for r in results] == ["timeout"] * 50
+    assert len(aborts) == 50
+
+    child_pids = [int(line) for line in pid_file.read_text().split()]
+    assert len(child_pids) == 50
+    deadline = time.monotonic() + 2
+    while any(process_alive(pid) for pid in child_pids) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not [pid for pid in child_pids if process_alive(pid)]
+
+
+def test_cancel_event_stops_execution(tmp_path):
+    pid_file = tmp_path / "children.pid"
+    cancel_event = threading.Event()
+    threading.Timer(0.2, cancel_event.set).start()
+
+    returncode, _, _, aborted = _run_cancellable(sandbox_like_command(pid_file), 30, cancel_event)
+
+    assert aborted == "cancelled"
+    assert returncode != 0
+    child_pid = int(pid_file.read_text())
+    time.sleep(0.1)
+    assert not process_alive(child_pid)
+
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    docker = bin_dir / "docker"
+    docker.write_text(FAKE_DOCKER)
+    docker.chmod(0o755)
+    log = tmp_path / "docker.log"
+    log.touch()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_DOCKER_LOG", str(log))
+    monkeypatch.setattr(process_lock, "LOCK_DIR", str(tmp_path))
+    monkeypatch.setattr(container_pool, "LOCK_DIR", str(tmp_path))
+    return log
+
+
+def docker_calls(log):
+    return log.read_text().splitlines()
+
+
+def job_files(log):
+    # The in-sandbox files of every warm job the log mentions
+    job_ids = set(re.findall(r"/tmp/lambda-([0-9a-f]{32})\.", log.read_text()))
+    return [path for job_id in job_ids for path in os.listdir("/tmp") if job_id in path]
+
+
+def wait_until_gone(pids):
+    deadline = time.monotonic() + 2
+    while any(process_alive(pid) for pid in pids) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not [pid for pid in pids if process_alive(pid)]
+
+
+@pytest.mark.parametrize("returncode, elapsed, aborted, expected", [
+    (0, 0.1, None, "ok"),
+    (1, 0.1, None, "error"),
+    (137, 5.0, None, "timeout"),
+    (124, 5.0, None, "timeout"),
+    # Killed before the limit, e.g. out of memory
+    (137, 0.5, None, "error"),
+    (-9, 1.0, "cancelled", "cancelled"),
+    (-9, 7.0, "timeout", "timeout"),
+])
+def test_status_classifies_exit_codes(returncode, elapsed, aborted, expected):
+    assert _status(returncode, elapsed, 5, aborted) == expected
+
+
+def test_cold_timeout_removes_its_container(fake_docker, monkeypatch):
+    monkeypatch.setattr(execution_engine, "KILL_GRACE_SECONDS", 0.2)
+
+    result = execution_engine.run_with_runtime("python-lambda-runtime", "python", "print(1)", timeout=0.3)
+
+    assert result["metrics"]["status"] == "timeout"
+    calls = docker_calls(fake_docker)
+    container_name = re.search(r"--name (\S+)", calls[0]).group(1)
+    assert calls[1:] == [f"rm -f {container_name}"]
+
+
+def test_warm_cancel_kills_the_recorded_process_group(fake_docker, tmp_path):
+    # The function forks a child; both must go
+    pids_file = tmp_path / "job.pids"
+    code = (
+        "import os, subprocess, time\n"
+        "child = subprocess.Popen(['sleep', '30'])\n"
+        f"open({str(pids_file)!r} + '.tmp', 'w').write(f'{{os.getpid()}} {{child.pid}}')\n"
+        f"os.rename({str(pids_file)!r} + '.tmp', {str(pids_file)!r})\n"
+        "time.sleep(30)\n"
+    )
+    cancel_event = threading.Event()
+
+    def cancel_once_running():
+        deadline = time.monotonic() + 10
+        while not pids_file.exists() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        cancel_event.set()
+
+    threading.Thread(target=cancel_once_running, daemon=True).start()
+    result = execution_engine.run_in_warm_container("warm-test", "python", code, timeout=30, cancel_event=cancel_event)
+
+    assert result["metrics"]["status"] == "cancelled"
+    assert wait_until_gone([int(pid) for pid in pids_file.read_text().split()])
+    assert job_files(fake_docker) == []
+    assert not os.path.exists(container_pool._taint_path("warm-test"))
+    assert "rm -f warm-test" not in docker_calls(fake_docker)
+
+
+def test_warm_cancel_before_start_keeps_the_job_from_running(fake_docker, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_EXEC_DELAY", "0.5")
+    ran = tmp_path / "ran"
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    result = execution_engine.run_in_warm_container(
+        "warm-test", "python", f"open({str(ran)!r}, 'w').close()", timeout=5, cancel_event=cancel_event
+    )
+
+    assert result["metrics"]["status"] == "cancelled"
+    time.sleep(1.5)
+    assert not ran.exists()
+    assert job_files(fake_docker) == []
+    assert not os.path.exists(container_pool._taint_path("warm-test"))
+
+
+def test_tainted_container_is_removed_only_after_every_slot_is_free(fake_docker, monkeypatch):
+    started = []
+    monkeypatch.setattr(container_pool, "start_warm_containers", lambda: started.append("warm-test"))
+    holding, release = threading.Event(), threading.Event()
+
+    def other_exec():
+        with container_pool.warm_slot("warm-test"):
+            holding.set()
+            release.wait(5)
+
+    other = threading.Thread(target=other_exec)
+    other.start()
+    assert holding.wait(5)
+    with container_pool.warm_slot("warm-test"):
+        container_pool.taint_warm_container("warm-test")
+    # Another execution still holds a slot
+    assert "rm -f warm-test" not in docker_calls(fake_docker)
+    assert started == []
+
+    release.set()
+    other.join(5)
+    assert docker_calls(fake_docker) == ["rm -f warm-test"]
+    assert started == ["warm-test"]
+    assert not os.path.exists(container_pool._taint_path("warm-test"))
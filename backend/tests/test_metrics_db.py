@@ -0,0 +1,140 @@
+import sqlite3
+
+import pytest
+
+from utils import metrics_db
+
+
+@pytest.fixture
+def metrics_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_db, "DB_PATH", str(tmp_path / "metrics.db"))
+    metrics_db.init_db()
+    return metrics_db.DB_PATH
+
+
+def insert_raw(db_path, function_name, duration, timestamp, error=None):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO metrics (function_name, duration, cpu_percent, memory_mb, error, timestamp) "
+        "VALUES (?, ?, 1.0, 10.0, ?, ?)",
+        (function_name, duration, error, timestamp),
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_compaction_rolls_up_old_rows_and_keeps_totals(metrics_store):
+    for i in range(10):
+        insert_raw(metrics_store, "hello", 1.0 + i, "2020-01-01 10:0%d:00" % i, error="boom" if i == 0 else None)
+    metrics_db.store_metrics("hello", {"duration": 2.0})
+    before = metrics_db.get_aggregated_metrics("hello")
+
+    # Small batches exercise the upsert into an existing bucket
+    assert metrics_db.compact_metrics(raw_retention_hours=1, rollup_retention_days=None, batch_size=3, pause_seconds=0) == 10
+
+    assert metrics_db.get_aggregated_metrics("hello") == before
+    stats = metrics_db.get_storage_stats()
+    assert stats["functions"]["hello"] == {"raw_rows": 1, "rollup_rows": 1}
+
+    conn = sqlite3.connect(metrics_store)
+    row = conn.execute(
+        "SELECT invocations, errors, min_duration, max_duration FROM metrics_rollup"
+    ).fetchone()
+    conn.close()
+    assert row == (10, 1, 1.0, 10.0)
+
+
+def test_compaction_drops_expired_rollups(metrics_store):
+    insert_raw(metrics_store, "old", 1.0, "2000-01-01 00:00:00")
+    metrics_db.compact_metrics(raw_retention_hours=1, rollup_retention_days=30, pause_seconds=0)
+    assert metrics_db.get_storage_stats()["functions"] == {}
+
+
+def test_expired_rollups_are_dropped_in_batches(metrics_store):
+    # Seven hourly buckets long past retention, one recent bucket
+    for hour in range(7):
+        insert_raw(metrics_store, "old", 1.0, "2000-01-01 %02d:00:00" % hour)
+    insert_raw(metrics_store, "old", 1.0, "2000-01-02 00:00:00")
+    metrics_db.compact_metrics(raw_retention_hours=1, rollup_retention_days=None, pause_seconds=0)
+    conn = sqlite3.connect(metrics_store)
+    conn.execute("UPDATE metrics_rollup SET bucket_start = CAST(strftime('%s', 'now') AS INTEGER) "
+                 "WHERE bucket_start = CAST(strftime('%s', '2000-01-02 00:00:00') AS INTEGER)")
+    conn.commit()
+    conn.close()
+
+    metrics_db.compact_metrics(raw_retention_hours=1, rollup_retention_days=30, batch_size=3, pause_seconds=0)
+
+    assert metrics_db.get_storage_stats()["functions"] == {"old": {"raw_rows": 0, "rollup_rows": 1}}
+
+
+def test_metrics_since_returns_only_new_points(metrics_store):
+    metrics_db.store_metrics("hello", {"duration": 1.0})
+    metrics_db.store_metrics("other", {"duration": 5.0})
+    first = metrics_db.get_metrics_since("hello")
+    assert [p["duration"] for p in first["points"]] == [1.0]
+
+    assert metrics_db.get_metrics_since("hello", first["cursor"]) == {"points": [], "cursor": first["cursor"]}
+
+    metrics_db.store_metrics("hello", {"duration": 2.0, "error": "boom"})
+    newer = metrics_db.get_metrics_since("hello", first["cursor"])
+    assert [(p["duration"], p["error"]) for p in newer["points"]] == [(2.0, "boom")]
+    assert newer["cursor"] > first["cursor"]
+
+
+def test_metrics_without_cursor_returns_newest_points(metrics_store):
+    assert metrics_db.get_metrics_since("hello") == {"points": [], "cursor": 0}
+    for i in range(5):
+        metrics_db.store_metrics("hello", {"duration": float(i)})
+    latest = metrics_db.get_metrics_since("hello", limit=2)
+    assert [p["duration"] for p in latest["points"]] == [3.0, 4.0]
+    assert metrics_db.get_metrics_since("hello", latest["cursor"])["points"] == []
+
+
+def test_timeouts_are_counted_through_compaction(metrics_store):
+    insert_raw(metrics_store, "slow", 5.0, "2020-01-01 10:00:00", error="Execution timed out.")
+    conn = sqlite3.connect(metrics_store)
+    conn.execute("UPDATE metrics SET status = 'timeout'")
+    conn.commit()
+    conn.close()
+    metrics_db.store_metrics("slow", {"duration": 5.0, "error": "Execution timed out.", "status": "timeout"})
+    metrics_db.store_metrics("slow", {"duration": 0.1})
+
+    assert metrics_db.get_aggregated_metrics("slow")["total_timeouts"] == 2
+    metrics_db.compact_metrics(raw_retention_hours=1, rollup_retention_days=None, pause_seconds=0)
+    assert metrics_db.get_aggregated_metrics("slow")["total_timeouts"] == 2
+    statuses = [p["status"] for p in metrics_db.get_metrics_since("slow")["points"]]
+    assert statuses == ["timeout", "ok"]
+
+
+def test_runtime_stats_use_the_runtime_index(metrics_store):
+    conn = sqlite3.connect(metrics_store)
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT duration FROM metrics WHERE function_name = ? AND runtime = ? "
+        "ORDER BY id DESC LIMIT 200", ("hello", "docker")
+    ).fetchall()
+    conn.close()
+    assert any("idx_metrics_function_runtime" in row[-1] for row in plan)
+
+
+def test_compaction_keeps_recent_runs_per_runtime(metrics_store):
+    conn = sqlite3.connect(metrics_store)
+    for i in range(5):
+        for runtime in ("docker", "gvisor"):
+            conn.execute(
+                "INSERT INTO metrics (function_name, duration, status, runtime, cold_start, timestamp) "
+                "VALUES ('rare', ?, 'ok', ?, 1, ?)",
+                (1.0 + i, runtime, "2020-01-0%d 10:00:00" % (i + 1)),
+            )
+    conn.commit()
+    conn.close()
+    before = metrics_db.get_aggregated_metrics("rare")
+
+    compacted = metrics_db.compact_metrics(raw_retention_hours=1, rollup_retention_days=None,
+                                           pause_seconds=0, keep_per_runtime=2)
+
+    assert compacted == 6
+    assert metrics_db.get_aggregated_metrics("rare") == before
+    stats = metrics_db.get_runtime_stats("rare", ["docker", "gvisor"], window=10)
+    assert {runtime: (s["samples"], s["p95_ms"]) for runtime, s in stats.items()} == {
+        "docker": (2, 5000.0), "gvisor": (2, 5000.0)
+    }
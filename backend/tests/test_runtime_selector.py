@@ -0,0 +1,57 @@
+from utils import metrics_db
+from utils.runtime_selector import MIN_SAMPLES, select_runtime
+
+
+def runtime_stats(p95_ms, error_rate=0.0, cold_start_rate=0.0, samples=50):
+    return {"samples": samples, "p95_ms": p95_ms, "error_rate": error_rate, "cold_start_rate": cold_start_rate}
+
+
+def history(warm, docker, gvisor):
+    return {"docker-warm": warm, "docker": docker, "gvisor": gvisor}
+
+
+def test_prefers_cheapest_runtime_meeting_target():
+    stats = history(runtime_stats(300), runtime_stats(900), runtime_stats(1200))
+    runtime, decision = select_runtime(stats, 1000, warm_occupancy=0.0)
+    assert runtime == "docker-warm"
+    assert decision["reason"] == "cheapest_meeting_target"
+    assert decision["candidates"] is stats
+
+
+def test_skips_busy_warm_pool():
+    stats = history(runtime_stats(300), runtime_stats(900), runtime_stats(1200))
+    runtime, _ = select_runtime(stats, 1000, warm_occupancy=1.0)
+    assert runtime == "docker"
+
+
+def test_skips_runtimes_with_too_many_errors():
+    stats = history(runtime_stats(300, error_rate=0.5), runtime_stats(900), runtime_stats(1200))
+    assert select_runtime(stats, 1000, warm_occupancy=0.0)[0] == "docker"
+
+
+def test_falls_back_to_fastest_when_target_unreachable():
+    stats = history(runtime_stats(3000), runtime_stats(2500), runtime_stats(4000))
+    runtime, decision = select_runtime(stats, 1000, warm_occupancy=0.0)
+    assert (runtime, decision["reason"]) == ("docker", "fastest_missing_target")
+
+
+def test_explores_runtimes_without_history():
+    stats = history(runtime_stats(300), runtime_stats(None, None, None, samples=0), runtime_stats(1200))
+    runtime, decision = select_runtime(stats, 1000, warm_occupancy=0.0)
+    assert (runtime, decision["reason"]) == ("docker", "explore")
+
+
+def test_runtime_stats_from_metrics_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_db, "DB_PATH", str(tmp_path / "metrics.db"))
+    metrics_db.init_db()
+    for i in range(MIN_SAMPLES):
+        metrics_db.store_metrics("fn", {"duration": 0.1 * (i + 1), "runtime": "docker-warm", "cold_start": i == 0})
+    metrics_db.store_metrics("fn", {"duration": 2.0, "error": "boom", "runtime": "docker", "cold_start": True,
+                                    "decision": {"policy": "auto", "reason": "explore"}})
+
+    stats = metrics_db.get_runtime_stats("fn", ["docker-warm", "docker", "gvisor"])
+    assert stats["docker-warm"]["samples"] == MIN_SAMPLES
+    assert round(stats["docker-warm"]["p95_ms"]) == round(MIN_SAMPLES * 100)
+    assert stats["docker-warm"]["cold_start_rate"] == 1 / MIN_SAMPLES
+    assert stats["docker"]["error_rate"] == 1.0
+    assert stats["gvisor"]["samples"] == 0
@@ -0,0 +1,235 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from models import database
+from models.function_model import FunctionMetadata as FunctionRecord
+from models.trigger_model import QueuedEvent, TriggerConfig
+from utils import triggers
+
+NOW = datetime(2024, 1, 1, 12, 0, 30)
+
+
+class FakeRunner:
+    """Stands in for run_function and records each batch it is given."""
+
+    def __init__(self):
+        self.batches = []
+        self.fail_if = lambda batch: False
+        self.started = threading.Semaphore(0)
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, function_name, language, code, runtime, events=None, **kwargs):
+        self.batches.append(events)
+        self.started.release()
+        self.gate.wait(5)
+        return {"metrics": {"status": "error" if self.fail_if(events) else "ok"}}
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'functions.db'}", connect_args={"check_same_thread": False})
+    database.Base.metadata.create_all(bind=engine)
+    database.Session.configure(bind=engine)
+    session = database.Session()
+    session.add(FunctionRecord(name="handler", route="/handler", language="python",
+                               timeout=5, runtime="docker", code="print('hi')"))
+    session.commit()
+    yield session
+    session.close()
+    database.Session.configure(bind=database.engine)
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    fake = FakeRunner()
+    monkeypatch.setattr(triggers, "run_function", fake)
+    yield fake
+    fake.gate.set()
+    assert triggers.wait_for_triggers(timeout=5)
+
+
+def add_trigger(db, **fields):
+    trigger = TriggerConfig(function_name="handler", enabled=True, **fields)
+    db.add(trigger)
+    db.commit()
+    return trigger
+
+
+def enqueue(db, count):
+    db.add_all([QueuedEvent(function_name="handler", payload=str(i)) for i in range(count)])
+    db.commit()
+
+
+def run_pass(db, now=NOW):
+    triggers.run_triggers_once(now)
+    assert triggers.wait_for_triggers(timeout=5)
+    db.expire_all()
+
+
+def queue_statuses(db):
+    return [(event.status, event.attempts) for event in db.query(QueuedEvent).order_by(QueuedEvent.id)]
+
+
+def test_queue_events_are_split_into_batches(db, runner):
+    add_trigger(db, kind="queue", batch_size=2, max_parallelism=3)
+    enqueue(db, 5)
+
+    run_pass(db)
+
+    assert sorted(runner.batches) == [[0, 1], [2, 3], [4]]
+    assert db.query(QueuedEvent).count() == 0
+
+
+def test_max_parallelism_caps_claims_until_running_batches_finish(db, runner):
+    add_trigger(db, kind="queue", batch_size=1, max_parallelism=2)
+    enqueue(db, 5)
+    runner.gate.clear()
+
+    triggers.run_triggers_once(NOW)
+    assert runner.started.acquire(timeout=5) and runner.started.acquire(timeout=5)
+    # Still running, so the next pass leaves the trigger alone
+    triggers.run_triggers_once(NOW)
+    assert len(runner.batches) == 2
+    db.expire_all()
+    assert queue_statuses(db) == [("claimed", 1)] * 2 + [("pending", 0)] * 3
+
+    runner.gate.set()
+    assert triggers.wait_for_triggers(timeout=5)
+    run_pass(db)
+    assert sorted(runner.batches) == [[0], [1], [2], [3]]
+    assert queue_statuses(db) == [("pending", 0)]
+
+
+def test_running_batches_block_a_scheduler_in_another_worker(db, runner, monkeypatch):
+    add_trigger(db, kind="queue", batch_size=1, max_parallelism=2)
+    enqueue(db, 5)
+    runner.gate.clear()
+
+    triggers.run_triggers_once(NOW)
+    assert runner.started.acquire(timeout=5) and runner.started.acquire(timeout=5)
+    # The next worker to take the triggers lock has its own in-flight map
+    with monkeypatch.context() as other_worker:
+        other_worker.setattr(triggers, "_in_flight", {})
+        triggers.run_triggers_once(NOW)
+    assert len(runner.batches) == 2
+    db.expire_all()
+    assert db.query(TriggerConfig).one().running == 2
+
+    runner.gate.set()
+    assert triggers.wait_for_triggers(timeout=5)
+    db.expire_all()
+    assert db.query(TriggerConfig).one().running == 0
+
+
+def test_running_count_left_by_a_dead_worker_expires(db, runner):
+    add_trigger(db, kind="queue", batch_size=10, max_parallelism=1, running=1,
+                running_since=NOW - timedelta(seconds=triggers.STALE_CLAIM_SECONDS + 1))
+    enqueue(db, 1)
+
+    run_pass(db)
+
+    assert runner.batches == [[0]]
+
+
+def test_failed_queue_events_are_retried_then_marked_failed(db, runner):
+    add_trigger(db, kind="queue", batch_size=10, max_parallelism=1)
+    enqueue(db, 1)
+    runner.fail_if = lambda batch: True
+
+    for attempt in range(1, triggers.MAX_EVENT_ATTEMPTS):
+        run_pass(db)
+        assert queue_statuses(db) == [("pending", attempt)]
+    run_pass(db)
+    assert queue_statuses(db) == [("failed", triggers.MAX_EVENT_ATTEMPTS)]
+
+    run_pass(db)
+    assert len(runner.batches) == triggers.MAX_EVENT_ATTEMPTS
+
+
+def test_stale_queue_claims_are_taken_back(db, runner):
+    add_trigger(db, kind="queue", batch_size=10, max_parallelism=1)
+    db.add(QueuedEvent(function_name="handler", payload="1", status="claimed", attempts=1,
+                       claimed_at=NOW - timedelta(seconds=triggers.STALE_CLAIM_SECONDS + 1)))
+    db.add(QueuedEvent(function_name="handler", payload="2", status="claimed", attempts=1, claimed_at=NOW))
+    db.commit()
+
+    run_pass(db)
+
+    assert runner.batches == [[1]]
+    assert queue_statuses(db) == [("claimed", 1)]
+
+
+def test_directory_files_move_by_batch_outcome(db, runner, tmp_path, monkeypatch):
+    monkeypatch.setattr(triggers, "TRIGGER_WATCH_ROOT", str(tmp_path / "watched"))
+    inbox = tmp_path / "watched" / "inbox"
+    inbox.mkdir(parents=True)
+    for age, name in enumerate(("c.txt", "b.txt", "a.txt")):
+        (inbox / name).write_text(name)
+        # Oldest first: a.txt and b.txt share a batch, c.txt runs alone
+        os.utime(inbox / name, (1000 - age, 1000 - age))
+    add_trigger(db, kind="directory", path=str(inbox), batch_size=2, max_parallelism=2)
+    runner.fail_if = lambda batch: [event["name"] for event in batch] == ["c.txt"]
+
+    run_pass(db)
+
+    assert sorted([event["content"] for event in batch] for batch in runner.batches) == [["a.txt", "b.txt"], ["c.txt"]]
+    assert sorted(p.name for p in (inbox / triggers.PROCESSED_DIR).iterdir()) == ["a.txt", "b.txt"]
+    assert sorted(p.name for p in (inbox / triggers.FAILED_DIR).iterdir()) == ["c.txt"]
+    assert list((inbox / triggers.PROCESSING_DIR).iterdir()) == []
+    assert not any(p.is_file() for p in inbox.iterdir())
+
+
+def test_directory_outside_watch_root_is_ignored(db, runner, tmp_path, monkeypatch):
+    monkeypatch.setattr(triggers, "TRIGGER_WATCH_ROOT", str(tmp_path / "watched"))
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    (elsewhere / "keep.txt").write_text("x")
+    add_trigger(db, kind="directory", path=str(elsewhere), batch_size=10, max_parallelism=1)
+
+    run_pass(db)
+
+    assert runner.batches == []
+    assert (elsewhere / "keep.txt").exists()
+
+
+def test_schedule_fires_minutes_missed_since_last_firing(db, runner):
+    trigger = add_trigger(db, kind="schedule", schedule="* * * * *", batch_size=10, max_parallelism=1,
+                          last_fired_at=datetime(2024, 1, 1, 11, 57))
+
+    run_pass(db)
+    run_pass(db)
+
+    assert runner.batches == [[
+        {"source": "schedule", "time": f"2024-01-01T{time}:00"} for time in ("11:58", "11:59", "12:00")
+    ]]
+    assert db.get(TriggerConfig, trigger.id).last_fired_at == datetime(2024, 1, 1, 12, 0)
+
+
+def test_schedule_catch_up_respects_max_parallelism(db, runner):
+    trigger = add_trigger(db, kind="schedule", schedule="* * * * *", batch_size=1, max_parallelism=2,
+                          last_fired_at=datetime(2024, 1, 1, 11, 49))
+
+    run_pass(db)
+    assert sorted(batch[0]["time"] for batch in runner.batches) == ["2024-01-01T11:50:00", "2024-01-01T11:51:00"]
+    assert db.get(TriggerConfig, trigger.id).last_fired_at == datetime(2024, 1, 1, 11, 51)
+
+    run_pass(db)
+    assert len(runner.batches) == 4
+    assert db.get(TriggerConfig, trigger.id).last_fired_at == datetime(2024, 1, 1, 11, 53)
+
+
+def test_triggers_of_a_function_without_code_are_skipped_with_a_warning(db, runner, capsys):
+    trigger = add_trigger(db, kind="queue", batch_size=10, max_parallelism=1)
+    enqueue(db, 1)
+    db.query(FunctionRecord).update({"code": None})
+    db.commit()
+
+    run_pass(db)
+
+    assert runner.batches == []
+    assert f"Trigger {trigger.id} skipped" in capsys.readouterr().out
@@ -1,4 +1,7 @@
+import os
 import subprocess
+from contextlib import ExitStack, contextmanager
+from utils.process_lock import LOCK_DIR, process_lock
 
 # Map of language → container name
 WARM_CONTAINERS = {
@@ -10,24 +13,85 @@ CONTAINER_IMAGES = {
     "python": "my-python-image"
 }
 
+# Concurrent executions a warm container is sized for
+WARM_POOL_SLOTS = int(os.getenv("WARM_POOL_SLOTS", "4"))
+
 def start_warm_containers():
-    for lang, container_name in WARM_CONTAINERS.items():
-        image = CONTAINER_IMAGES.get(lang)
-        if not image:
-            continue
-
-        # Check if already running
-        status = subprocess.run(["docker", "ps", "-q", "-f", f"name={container_name}"], capture_output=True, text=True)
-        if status.stdout.strip():
-            print(f"[INFO] Warm container for {lang} already running.")
-            continue
-
-        # Start container
-        print(f"[INFO] Starting warm container: {container_name}")
-        cmd = [
-            "docker", "run", "-d",
-            "--name", container_name,
-            image,
-            "tail", "-f", "/dev/null"
-        ]
-        subprocess.run(cmd)
+    # Every worker runs this on startup; serialize them so only one of them
+    # creates each container and the rest see it already running.
+    with process_lock("warm-pool"):
+        for lang, container_name in WARM_CONTAINERS.items():
+            image = CONTAINER_IMAGES.get(lang)
+            if not image:
+                continue
+
+            try:
+                # Check if already running
+                status = subprocess.run(["docker", "ps", "-q", "-f", f"name={container_name}"], capture_output=True, text=True)
+            except FileNotFoundError:
+                print("[WARN] docker CLI not found; skipping warm containers.")
+                return
+            if status.stdout.strip():
+                print(f"[INFO] Warm container for {lang} already running.")
+                continue
+
+            # Start container
+            print(f"[INFO] Starting warm container: {container_name}")
+            cmd = [
+                "docker", "run", "-d",
+                "--name", container_name,
+                image,
+                "tail", "-f", "/dev/null"
+            ]
+            subprocess.run(cmd)
+
+def _taint_path(container_name: str) -> str:
+    return os.path.join(LOCK_DIR, f"lambda-{container_name}.tainted")
+
+def taint_warm_container(container_name: str):
+    # The container may still hold processes from an aborted execution.
+    # Other executions can be running in it too, so it is only replaced
+    # once the pool drains (see warm_slot).
+    print(f"[WARN] Warm container {container_name} marked for recycling.")
+    open(_taint_path(container_name), "a").close()
+
+def _recycle_if_drained(container_name: str):
+    taint_path = _taint_path(container_name)
+    if not os.path.exists(taint_path):
+        return
+    recycled = False
+    with process_lock("warm-pool"), ExitStack() as slots:
+        # Holding every slot means no other exec is using the container
+        if all(slots.enter_context(process_lock(f"{container_name}-slot-{slot}", blocking=False))
+               for slot in range(WARM_POOL_SLOTS)) and os.path.exists(taint_path):
+            print(f"[INFO] Recycling warm container: {container_name}")
+            subprocess.run(["docker", "rm", "-f", container_name], capture_output=True)
+            os.remove(taint_path)
+            recycled = True
+    if recycled:
+        start_warm_containers()
+
+@contextmanager
+def warm_slot(container_name: str):
+    # Hold one of the container's slot locks while an exec runs, so every
+    # worker process can see how busy the warm pool is. Yields the slot
+    # number, or None when all slots are taken (the exec still runs).
+    try:
+        for slot in range(WARM_POOL_SLOTS):
+            with process_lock(f"{container_name}-slot-{slot}", blocking=False) as acquired:
+                if acquired:
+                    yield slot
+                    return
+        yield None
+    finally:
+        # The last exec to leave a tainted container replaces it
+        _recycle_if_drained(container_name)
+
+def warm_pool_occupancy(container_name: str) -> float:
+    """Fraction of the container's slots currently in use, across workers."""
+    busy = 0
+    for slot in range(WARM_POOL_SLOTS):
+        with process_lock(f"{container_name}-slot-{slot}", blocking=False) as acquired:
+            if not acquired:
+                busy += 1
+    return busy / WARM_POOL_SLOTS
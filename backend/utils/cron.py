@@ -0,0 +1,52 @@
+# Minimal cron expression support for schedule triggers:
+# "minute hour day-of-month month day-of-week" with *, */n, a-b, a-b/n and
+# comma-separated lists. Day-of-week 0 and 7 are both Sunday.
+
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid step in cron field: {field}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field out of range: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_cron(expression: str):
+    """Parse a cron expression into one set of allowed values per field."""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError("Cron expression must have 5 fields.")
+    try:
+        parsed = [_parse_field(field, low, high) for field, (low, high) in zip(fields, FIELD_RANGES)]
+    except ValueError as e:
+        raise ValueError(f"Invalid cron expression '{expression}': {e}")
+    if 7 in parsed[4]:
+        parsed[4] = (parsed[4] - {7}) | {0}
+    # Remember which day fields were restricted (cron ORs them in that case)
+    parsed.append((fields[2] != "*", fields[4] != "*"))
+    return parsed
+
+def cron_matches(expression: str, when) -> bool:
+    minutes, hours, days, months, weekdays, (dom_set, dow_set) = parse_cron(expression)
+    if when.minute not in minutes or when.hour not in hours or when.month not in months:
+        return False
+    day_ok = when.day in days
+    weekday_ok = (when.weekday() + 1) % 7 in weekdays
+    if dom_set and dow_set:
+        return day_ok or weekday_ok
+    return day_ok and weekday_ok
@@ -1,92 +1,293 @@
 # backend/utils/execution_engine.py
 
+import json
 import subprocess
+import signal
 import time
 import psutil
 import tempfile
 import os
 import uuid
+from utils.container_pool import WARM_CONTAINERS, start_warm_containers, taint_warm_container, warm_slot
 from utils.metrics_db import store_metrics
+from utils.runtime_selector import choose_runtime
 
-def run_in_warm_container(container_name: str, language: str, code: str):
+SUPPORTED_RUNTIMES = ("docker", "docker-warm", "gvisor")
+# "auto" picks one of SUPPORTED_RUNTIMES per invocation from observed history
+RUNTIME_MODES = SUPPORTED_RUNTIMES + ("auto",)
+# docker exec errors meaning the warm container has to be (re)started
+WARM_CONTAINER_MISSING = ("No such container", "is not running")
+
+# Used when a function has no timeout in its metadata
+DEFAULT_WARM_TIMEOUT = 5
+DEFAULT_COLD_TIMEOUT = 10
+# The in-sandbox `timeout` kills the function first; the host only steps in
+# if the docker CLI is still running this much later (or on cancellation).
+KILL_GRACE_SECONDS = 2
+POLL_INTERVAL = 0.1
+# Trigger batches reach the function as a JSON file named by this variable;
+# they can be far larger than one command-line argument may be.
+EVENTS_FILE_ENV = "LAMBDA_EVENTS_FILE"
+
+def _run_cancellable(cmd, deadline_seconds, cancel_event=None, on_abort=None):
+    """Run cmd, killing it on host-side deadline or when cancel_event is set.
+
+    The command runs in its own session so the whole process group can be
+    killed. on_abort() is called first to reclaim whatever the command
+    started outside this host process tree (containers, docker exec jobs).
+    Returns (returncode, stdout, stderr, aborted) where aborted is None,
+    "timeout" or "cancelled".
+    """
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, start_new_session=True
+    )
+    deadline = time.monotonic() + deadline_seconds
+    while True:
+        try:
+            stdout, stderr = proc.communicate(timeout=POLL_INTERVAL)
+            return proc.returncode, stdout, stderr, None
+        except subprocess.TimeoutExpired:
+            if cancel_event is not None and cancel_event.is_set():
+                aborted = "cancelled"
+            elif time.monotonic() >= deadline:
+                aborted = "timeout"
+            else:
+                continue
+
+        try:
+            if on_abort is not None:
+                on_abort()
+        finally:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        stdout, stderr = proc.communicate()
+        return proc.returncode, stdout, stderr, aborted
+
+def _status(returncode, elapsed, timeout, aborted):
+    if aborted:
+        return aborted
+    # `timeout -s KILL` exits 137 once the limit is hit
+    if returncode in (124, 137) and elapsed >= timeout:
+        return "timeout"
+    return "ok" if returncode == 0 else "error"
+
+def _build_result(stdout, stderr, returncode, status, duration, process):
+    error = None
+    if status == "timeout":
+        error = "Execution timed out."
+    elif status == "cancelled":
+        error = "Execution cancelled."
+    elif status == "error":
+        error = stderr.strip()
+
+    metrics = {
+        "duration": duration,
+        "cpu_percent": process.cpu_percent(interval=None),
+        "memory_mb": process.memory_info().rss / (1024 * 1024),
+        "error": error,
+        "status": status
+    }
+    result = {
+        "stdout": stdout.strip(),
+        "stderr": stderr.strip(),
+        "returncode": returncode,
+        "metrics": metrics
+    }
+    if status in ("timeout", "cancelled"):
+        result["error"] = error
+    return result
+
+def _error_result(message):
+    return {
+        "error": message,
+        "metrics": {"duration": 0, "cpu_percent": 0, "memory_mb": 0, "error": message, "status": "error"}
+    }
+
+def _env_args(env):
+    args = []
+    for key, value in (env or {}).items():
+        args += ["-e", f"{key}={value}"]
+    return args
+
+def run_in_warm_container(container_name: str, language: str, code: str,
+                          timeout: int = DEFAULT_WARM_TIMEOUT, cancel_event=None, env=None, events=None):
     try:
         if language == "python":
-            cmd = ["docker", "exec", container_name, "python3", "-c", code]
+            fn_cmd = ["python3", "-c", code]
         elif language == "javascript":
-            cmd = ["docker", "exec", container_name, "node", "-e", code]
+            fn_cmd = ["node", "-e", code]
         else:
-            return {"error": "Unsupported language for warm execution"}
+            return _error_result("Unsupported language for warm execution")
+
+        # `timeout` puts the function in its own process group and kills the
+        # whole group at the limit. Its pid (== pgid) is recorded so the host
+        # can kill the group if the exec has to be aborted from outside.
+        # The wrapper and the abort path race to create the pid file: if the
+        # abort gets there first the job never starts.
+        job_id = uuid.uuid4().hex
+        pid_file = f"/tmp/lambda-{job_id}.pid"
+        events_file = f"/tmp/lambda-{job_id}.events.json"
+        job_files = f"{pid_file} {events_file}"
+        if events is not None:
+            env = dict(env or {}, **{EVENTS_FILE_ENV: events_file})
+        wrapper = (
+            f'(set -C; echo starting > {pid_file}) 2>/dev/null || {{ rm -f {job_files}; exit 137; }}; '
+            f'timeout -s KILL {timeout} "$@" & echo $! > {pid_file}; wait $!; rc=$?; rm -f {job_files}; exit $rc'
+        )
+        cmd = ["docker", "exec"] + _env_args(env) + [container_name, "sh", "-c", wrapper, "sh"] + fn_cmd
+
+        def run_job():
+            if events is not None:
+                # Stream the batch into the container before starting the job
+                copied = subprocess.run(
+                    ["docker", "exec", "-i", container_name, "sh", "-c", f"cat > {events_file}"],
+                    input=json.dumps(events), capture_output=True, text=True
+                )
+                if copied.returncode != 0:
+                    return copied.returncode, copied.stdout, copied.stderr, None
+            return _run_cancellable(cmd, timeout + KILL_GRACE_SECONDS, cancel_event, kill_in_sandbox)
+
+        # Creating the pid file means the job has either finished or not
+        # started yet (and now never will). Otherwise it holds the process
+        # group to kill, or "starting" if the job is being launched right
+        # now; that case fails and the container is tainted.
+        abort_script = (
+            f'if (set -C; echo cancelled > {pid_file}) 2>/dev/null; then rm -f {events_file}; exit 0; fi; '
+            f'pgid=$(cat {pid_file}); case "$pgid" in ""|*[!0-9]*) exit 1;; esac; '
+            f'kill -KILL -$pgid && rm -f {job_files}'
+        )
+
+        def kill_in_sandbox():
+            try:
+                killed = subprocess.run(
+                    ["docker", "exec", container_name, "sh", "-c", abort_script],
+                    capture_output=True, timeout=KILL_GRACE_SECONDS
+                )
+                reclaimed = killed.returncode == 0
+            except subprocess.TimeoutExpired:
+                reclaimed = False
+            if not reclaimed:
+                # The sandbox may hold stray processes; replace it once the
+                # executions sharing it have finished
+                taint_warm_container(container_name)
 
         start = time.time()
         process = psutil.Process()
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+        cold_start = False
+        with warm_slot(container_name):
+            returncode, stdout, stderr, aborted = run_job()
+            if returncode != 0 and not aborted and any(msg in stderr for msg in WARM_CONTAINER_MISSING):
+                # The pool was cold: start the container and pay for it here
+                cold_start = True
+                start_warm_containers()
+                returncode, stdout, stderr, aborted = run_job()
         end = time.time()
 
-        metrics = {
-            "duration": end - start,
-            "cpu_percent": process.cpu_percent(interval=None),
-            "memory_mb": process.memory_info().rss / (1024 * 1024),
-            "error": None if result.returncode == 0 else result.stderr.strip()
-        }
-        store_metrics(language, metrics)
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "returncode": result.returncode,
-            "metrics": metrics
-        }
-
-    except subprocess.TimeoutExpired:
-        return {"error": "Execution timed out."}
+        status = _status(returncode, end - start, timeout, aborted)
+        result = _build_result(stdout, stderr, returncode, status, end - start, process)
+        result["metrics"]["cold_start"] = cold_start
+        return result
+
     except Exception as e:
-        return {"error": str(e)}
+        return _error_result(str(e))
 
-def run_with_runtime(image: str, language: str, code: str, runtime: str = "runc"):
+def run_with_runtime(image: str, language: str, code: str, runtime: str = "runc",
+                     timeout: int = DEFAULT_COLD_TIMEOUT, cancel_event=None, env=None, events=None):
     file_ext = "py" if language == "python" else "js" if language == "javascript" else None
     if file_ext is None:
-        return {"error": "Unsupported language"}
+        return _error_result("Unsupported language")
 
     filename = f"temp_{uuid.uuid4().hex}.{file_ext}"
+    container_name = f"lambda-{uuid.uuid4().hex[:12]}"
 
     try:
         with tempfile.TemporaryDirectory() as tmpdirname:
             filepath = os.path.join(tmpdirname, filename)
             with open(filepath, "w") as f:
                 f.write(code)
+            if events is not None:
+                # Shares the mount with the code file
+                with open(os.path.join(tmpdirname, "events.json"), "w") as f:
+                    json.dump(events, f)
+                env = dict(env or {}, **{EVENTS_FILE_ENV: "/usr/src/app/events.json"})
 
             exec_cmd = f"python {filename}" if language == "python" else f"node {filename}"
 
             docker_cmd = [
                 "docker", "run", "--rm",
+                "--name", container_name,
                 "--runtime", runtime,
                 "-v", f"{tmpdirname}:/usr/src/app",
                 "-w", "/usr/src/app",
-                image, "sh", "-c", exec_cmd
+            ] + _env_args(env) + [
+                image, "timeout", "-s", "KILL", str(timeout), "sh", "-c", exec_cmd
             ]
 
+            def remove_container():
+                # Killing the CLI alone leaves the container running
+                subprocess.run(["docker", "rm", "-f", container_name],
+                               capture_output=True, timeout=KILL_GRACE_SECONDS * 5)
+
             start = time.time()
             process = psutil.Process()
-            result = subprocess.run(docker_cmd, capture_output=True, text=True, timeout=10)
+            returncode, stdout, stderr, aborted = _run_cancellable(
+                docker_cmd, timeout + KILL_GRACE_SECONDS, cancel_event, remove_container
+            )
             end = time.time()
 
-            metrics = {
-                "duration": end - start,
-                "cpu_percent": process.cpu_percent(interval=None),
-                "memory_mb": process.memory_info().rss / (1024 * 1024),
-                "error": None if result.returncode == 0 else result.stderr.strip()
-            }
-            store_metrics(language, metrics)
-
-            return {
-                "stdout": result.stdout.strip(),
-                "stderr": result.stderr.strip(),
-                "returncode": result.returncode,
-                "metrics": metrics
-            }
-
-    except subprocess.TimeoutExpired:
-        return {"error": "Execution timed out."}
+            status = _status(returncode, end - start, timeout, aborted)
+            result = _build_result(stdout, stderr, returncode, status, end - start, process)
+            # Every run starts a fresh container
+            result["metrics"]["cold_start"] = True
+            return result
+
     except Exception as e:
-        return {"error": str(e)}
+        return _error_result(str(e))
+
+def run_function(function_name: str, language: str, code: str, runtime: str,
+                 timeout: int = None, cancel_event=None, env=None, latency_target_ms: int = None,
+                 events=None):
+    """Execute code on the chosen runtime and record its metrics once.
+
+    env is passed to the function process as environment variables; events
+    (a JSON-serializable batch) is written to the file named by
+    LAMBDA_EVENTS_FILE inside the sandbox. With
+    runtime "auto" the runtime is chosen from the function's history and
+    the decision is stored with the invocation's metrics.
+    """
+    container_name = WARM_CONTAINERS.get(language, "warm-python-fn")
+    decision = None
+    if runtime == "auto":
+        runtime, decision = choose_runtime(function_name, container_name, latency_target_ms)
+
+    # Warm container
+    if runtime == "docker-warm":
+        result = run_in_warm_container(
+            container_name, language, code,
+            timeout=timeout or DEFAULT_WARM_TIMEOUT, cancel_event=cancel_event, env=env, events=events
+        )
+
+    # gVisor simulation with runc (since WSL2 doesn't support runsc)
+    elif runtime == "gvisor":
+        result = run_with_runtime(
+            "python-lambda-runtime", language, code, runtime="runc",
+            timeout=timeout or DEFAULT_COLD_TIMEOUT, cancel_event=cancel_event, env=env, events=events
+        )
+
+    # Cold Docker (default)
+    elif runtime == "docker":
+        result = run_with_runtime(
+            "python-lambda-runtime", language, code, runtime="runc",
+            timeout=timeout or DEFAULT_COLD_TIMEOUT, cancel_event=cancel_event, env=env, events=events
+        )
+
+    else:
+        raise ValueError(f"Unsupported runtime: {runtime}")
 
+    result["metrics"]["runtime"] = runtime
+    result["metrics"]["decision"] = decision
+    store_metrics(function_name, result["metrics"])
+    return result
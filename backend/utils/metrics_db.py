@@ -1,11 +1,32 @@
 import sqlite3
 from datetime import datetime
+import json
 import os
+import time
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '../../metrics.db')
+DB_PATH = os.getenv("METRICS_DB_PATH", os.path.join(os.path.dirname(__file__), '../../metrics.db'))
+# Recent raw runs per function and runtime that the "auto" policy reads;
+# compaction leaves these alone however old they are
+RUNTIME_STATS_WINDOW = int(os.getenv("AUTO_RUNTIME_STATS_WINDOW", "200"))
+
+def _connect():
+    # Several worker processes write here concurrently; wait for the lock
+    # instead of failing with "database is locked".
+    return sqlite3.connect(DB_PATH, timeout=30)
+
+def _ensure_column(cursor, table, column, column_type):
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
+    # Incremental auto-vacuum lets the retention job hand freed pages back to
+    # the filesystem. Switching an existing database over needs one VACUUM.
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute("PRAGMA journal_mode=WAL")
     c = conn.cursor()
     c.execute("""
         CREATE TABLE IF NOT EXISTS metrics (
@@ -15,40 +36,279 @@ def init_db():
             cpu_percent FLOAT,
             memory_mb FLOAT,
             error TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT,
+            runtime TEXT,
+            cold_start INTEGER,
+            decision TEXT
+        );
+    """)
+    # Older databases predate these columns
+    _ensure_column(c, "metrics", "status", "TEXT")
+    _ensure_column(c, "metrics", "runtime", "TEXT")
+    _ensure_column(c, "metrics", "cold_start", "INTEGER")
+    # JSON record of why the "auto" runtime policy picked this runtime
+    _ensure_column(c, "metrics", "decision", "TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_metrics_function_ts ON metrics (function_name, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_metrics_function_id ON metrics (function_name, id)")
+    # Recent history per runtime for the "auto" policy
+    c.execute("CREATE INDEX IF NOT EXISTS idx_metrics_function_runtime ON metrics (function_name, runtime, id)")
+    # Downsampled history: one row per function per time bucket
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_rollup (
+            function_name TEXT,
+            bucket_start INTEGER,
+            bucket_seconds INTEGER,
+            invocations INTEGER,
+            errors INTEGER,
+            timeouts INTEGER DEFAULT 0,
+            total_duration FLOAT,
+            min_duration FLOAT,
+            max_duration FLOAT,
+            total_cpu_percent FLOAT,
+            max_memory_mb FLOAT,
+            PRIMARY KEY (function_name, bucket_start, bucket_seconds)
         );
     """)
+    _ensure_column(c, "metrics_rollup", "timeouts", "INTEGER DEFAULT 0")
     conn.commit()
     conn.close()
 
 def store_metrics(function_name, metrics):
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
     c.execute("""
-        INSERT INTO metrics (function_name, duration, cpu_percent, memory_mb, error)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT INTO metrics (function_name, duration, cpu_percent, memory_mb, error, status,
+                             runtime, cold_start, decision)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         function_name,
         metrics.get("duration", 0),
         metrics.get("cpu_percent", 0),
         metrics.get("memory_mb", 0),
-        metrics.get("error")
+        metrics.get("error"),
+        metrics.get("status", "ok" if metrics.get("error") is None else "error"),
+        metrics.get("runtime"),
+        metrics.get("cold_start"),
+        json.dumps(metrics["decision"]) if metrics.get("decision") else None
     ))
     conn.commit()
     conn.close()
 
 def get_aggregated_metrics(function_name):
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
+    # Raw rows plus whatever the retention job has already rolled up
     c.execute("""
-        SELECT AVG(duration), COUNT(*)
-        FROM metrics
-        WHERE function_name = ?
-    """, (function_name,))
-    result = c.fetchone()
+        SELECT SUM(invocations), SUM(total_duration), SUM(timeouts) FROM (
+            SELECT COUNT(*) AS invocations, SUM(duration) AS total_duration,
+                   SUM(status = 'timeout') AS timeouts
+            FROM metrics
+            WHERE function_name = ?
+            UNION ALL
+            SELECT SUM(invocations), SUM(total_duration), SUM(timeouts)
+            FROM metrics_rollup
+            WHERE function_name = ?
+        )
+    """, (function_name, function_name))
+    invocations, total_duration, timeouts = c.fetchone()
+    conn.close()
+    return {
+        "average_duration": total_duration / invocations if invocations else None,
+        "total_invocations": invocations or 0,
+        "total_timeouts": timeouts or 0
+    }
+
+def get_metrics_since(function_name, cursor=None, limit=500):
+    # Raw points newer than the cursor (a metrics row id), oldest first.
+    # Without a cursor, the newest `limit` points.
+    conn = _connect()
+    c = conn.cursor()
+    if cursor is None:
+        c.execute("""
+            SELECT id, timestamp, duration, cpu_percent, memory_mb, error, status, runtime
+            FROM metrics
+            WHERE function_name = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (function_name, limit))
+        rows = c.fetchall()[::-1]
+    else:
+        c.execute("""
+            SELECT id, timestamp, duration, cpu_percent, memory_mb, error, status, runtime
+            FROM metrics
+            WHERE function_name = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (function_name, cursor, limit))
+        rows = c.fetchall()
+    conn.close()
+    points = [
+        {
+            "id": row[0],
+            "timestamp": row[1],
+            "duration": row[2],
+            "cpu_percent": row[3],
+            "memory_mb": row[4],
+            "error": row[5],
+            "status": row[6],
+            "runtime": row[7]
+        }
+        for row in rows
+    ]
+    return {
+        "points": points,
+        "cursor": points[-1]["id"] if points else (cursor or 0)
+    }
+
+def get_runtime_stats(function_name, runtimes, window=200):
+    """Latency and reliability of a function's recent runs on each runtime.
+
+    Looks at the last `window` raw invocations per runtime.
+    """
+    conn = _connect()
+    c = conn.cursor()
+    stats = {}
+    for runtime in runtimes:
+        c.execute("""
+            SELECT duration, status, cold_start
+            FROM metrics
+            WHERE function_name = ? AND runtime = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (function_name, runtime, window))
+        rows = c.fetchall()
+        durations = sorted(row[0] for row in rows)
+        stats[runtime] = {
+            "samples": len(rows),
+            # Nearest-rank 95th percentile
+            "p95_ms": durations[max(0, -(-95 * len(durations) // 100) - 1)] * 1000 if durations else None,
+            "error_rate": sum(row[1] not in (None, "ok") for row in rows) / len(rows) if rows else None,
+            "cold_start_rate": sum(bool(row[2]) for row in rows) / len(rows) if rows else None
+        }
+    conn.close()
+    return stats
+
+def compact_metrics(raw_retention_hours=24, bucket_seconds=3600, rollup_retention_days=90,
+                    batch_size=5000, pause_seconds=0.05, vacuum_pages=1000,
+                    keep_per_runtime=RUNTIME_STATS_WINDOW):
+    """Roll raw rows older than the retention window into coarse buckets.
+
+    Works in short batches so concurrent store_metrics() calls only ever
+    wait for one batch. The newest keep_per_runtime rows of each function
+    on each runtime stay raw for get_runtime_stats(). Returns the number
+    of raw rows compacted.
+    """
+    conn = _connect()
+    conn.isolation_level = None  # explicit transactions below
+    compacted = 0
+    try:
+        cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{raw_retention_hours} hours",)).fetchone()[0]
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS kept_metrics (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM kept_metrics")
+        if keep_per_runtime:
+            conn.execute("""
+                INSERT INTO kept_metrics
+                SELECT id FROM (
+                    SELECT id, timestamp,
+                           ROW_NUMBER() OVER (PARTITION BY function_name, runtime ORDER BY id DESC) AS recent
+                    FROM metrics
+                    WHERE runtime IS NOT NULL
+                )
+                WHERE recent <= ? AND timestamp < ?
+            """, (keep_per_runtime, cutoff))
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            max_id = conn.execute("""
+                SELECT MAX(id) FROM (
+                    SELECT id FROM metrics
+                    WHERE timestamp < ? AND id NOT IN (SELECT id FROM kept_metrics)
+                    ORDER BY id LIMIT ?
+                )
+            """, (cutoff, batch_size)).fetchone()[0]
+            if max_id is None:
+                conn.execute("COMMIT")
+                break
+            conn.execute("""
+                INSERT INTO metrics_rollup (
+                    function_name, bucket_start, bucket_seconds, invocations, errors, timeouts,
+                    total_duration, min_duration, max_duration, total_cpu_percent, max_memory_mb
+                )
+                SELECT function_name,
+                       CAST(strftime('%s', timestamp) AS INTEGER) / :bucket * :bucket,
+                       :bucket,
+                       COUNT(*),
+                       COUNT(error),
+                       SUM(status = 'timeout'),
+                       SUM(duration),
+                       MIN(duration),
+                       MAX(duration),
+                       SUM(cpu_percent),
+                       MAX(memory_mb)
+                FROM metrics
+                WHERE id <= :max_id AND timestamp < :cutoff AND id NOT IN (SELECT id FROM kept_metrics)
+                GROUP BY 1, 2
+                ON CONFLICT (function_name, bucket_start, bucket_seconds) DO UPDATE SET
+                    invocations = invocations + excluded.invocations,
+                    errors = errors + excluded.errors,
+                    timeouts = timeouts + excluded.timeouts,
+                    total_duration = total_duration + excluded.total_duration,
+                    min_duration = MIN(min_duration, excluded.min_duration),
+                    max_duration = MAX(max_duration, excluded.max_duration),
+                    total_cpu_percent = total_cpu_percent + excluded.total_cpu_percent,
+                    max_memory_mb = MAX(max_memory_mb, excluded.max_memory_mb)
+            """, {"bucket": bucket_seconds, "max_id": max_id, "cutoff": cutoff})
+            deleted = conn.execute(
+                "DELETE FROM metrics WHERE id <= ? AND timestamp < ? AND id NOT IN (SELECT id FROM kept_metrics)",
+                (max_id, cutoff)
+            ).rowcount
+            conn.execute("COMMIT")
+            compacted += deleted
+            # Give waiting writers a chance between batches
+            time.sleep(pause_seconds)
+
+        if rollup_retention_days is not None:
+            # Expired rollups go in batches too, for the same reason
+            rollup_cutoff = conn.execute(
+                "SELECT CAST(strftime('%s', 'now', ?) AS INTEGER)", (f"-{rollup_retention_days} days",)
+            ).fetchone()[0]
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                deleted = conn.execute("""
+                    DELETE FROM metrics_rollup WHERE rowid IN (
+                        SELECT rowid FROM metrics_rollup WHERE bucket_start < ? LIMIT ?
+                    )
+                """, (rollup_cutoff, batch_size)).rowcount
+                conn.execute("COMMIT")
+                if deleted < batch_size:
+                    break
+                time.sleep(pause_seconds)
+        conn.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+    return compacted
+
+def get_storage_stats():
+    conn = _connect()
+    c = conn.cursor()
+    page_size = c.execute("PRAGMA page_size").fetchone()[0]
+    page_count = c.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = c.execute("PRAGMA freelist_count").fetchone()[0]
+    functions = {}
+    for name, rows in c.execute("SELECT function_name, COUNT(*) FROM metrics GROUP BY function_name"):
+        functions.setdefault(name, {"raw_rows": 0, "rollup_rows": 0})["raw_rows"] = rows
+    for name, rows in c.execute("SELECT function_name, COUNT(*) FROM metrics_rollup GROUP BY function_name"):
+        functions.setdefault(name, {"raw_rows": 0, "rollup_rows": 0})["rollup_rows"] = rows
     conn.close()
+    wal_path = DB_PATH + "-wal"
     return {
-        "average_duration": result[0],
-        "total_invocations": result[1]
+        "db_size_bytes": page_size * page_count,
+        "free_bytes": page_size * free_pages,
+        "wal_size_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        "raw_rows": sum(f["raw_rows"] for f in functions.values()),
+        "rollup_rows": sum(f["rollup_rows"] for f in functions.values()),
+        "functions": functions
     }
 
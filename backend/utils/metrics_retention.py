@@ -0,0 +1,39 @@
+import os
+import threading
+import time
+from utils.metrics_db import compact_metrics
+from utils.process_lock import process_lock
+
+# Raw rows are kept for this long, then folded into rollup buckets
+RAW_RETENTION_HOURS = float(os.getenv("METRICS_RAW_RETENTION_HOURS", "24"))
+ROLLUP_BUCKET_SECONDS = int(os.getenv("METRICS_ROLLUP_BUCKET_SECONDS", "3600"))
+ROLLUP_RETENTION_DAYS = float(os.getenv("METRICS_ROLLUP_RETENTION_DAYS", "90"))
+RETENTION_BATCH_SIZE = int(os.getenv("METRICS_RETENTION_BATCH_SIZE", "5000"))
+RETENTION_INTERVAL_SECONDS = float(os.getenv("METRICS_RETENTION_INTERVAL_SECONDS", "600"))
+
+def run_retention_pass():
+    # Only one worker process compacts at a time; the others skip this round
+    with process_lock("metrics-retention", blocking=False) as acquired:
+        if not acquired:
+            return None
+        return compact_metrics(
+            raw_retention_hours=RAW_RETENTION_HOURS,
+            bucket_seconds=ROLLUP_BUCKET_SECONDS,
+            rollup_retention_days=ROLLUP_RETENTION_DAYS,
+            batch_size=RETENTION_BATCH_SIZE,
+        )
+
+def _retention_loop():
+    while True:
+        try:
+            compacted = run_retention_pass()
+            if compacted:
+                print(f"[INFO] Compacted {compacted} metric rows into rollups.")
+        except Exception as e:
+            print(f"[WARN] Metrics retention pass failed: {e}")
+        time.sleep(RETENTION_INTERVAL_SECONDS)
+
+def start_retention_worker():
+    thread = threading.Thread(target=_retention_loop, name="metrics-retention", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,27 @@
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Directory shared by all worker processes on the host
+LOCK_DIR = os.getenv("LAMBDA_LOCK_DIR", tempfile.gettempdir())
+
+@contextmanager
+def process_lock(name: str, blocking: bool = True):
+    """Host-wide lock shared by every worker process.
+
+    Yields True once the lock is held. With blocking=False it yields False
+    immediately if another process already holds it.
+    """
+    path = os.path.join(LOCK_DIR, f"lambda-{name}.lock")
+    with open(path, "a") as lock_file:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,71 @@
+import os
+from utils.container_pool import warm_pool_occupancy
+from utils.metrics_db import RUNTIME_STATS_WINDOW, get_runtime_stats
+
+# Relative cost of one invocation: a cold container pays image start-up on
+# every call, and the gVisor sandbox adds syscall overhead on top of that.
+RUNTIME_COST = {
+    "docker-warm": 1.0,
+    "docker": 3.0,
+    "gvisor": 4.0,
+}
+# Used when the function has no latency_target_ms in its metadata
+DEFAULT_LATENCY_TARGET_MS = int(os.getenv("AUTO_RUNTIME_LATENCY_TARGET_MS", "2000"))
+# Runs needed on a runtime before its statistics are trusted
+MIN_SAMPLES = int(os.getenv("AUTO_RUNTIME_MIN_SAMPLES", "5"))
+MAX_ERROR_RATE = float(os.getenv("AUTO_RUNTIME_MAX_ERROR_RATE", "0.2"))
+# The warm pool is skipped once this share of its slots is busy
+MAX_WARM_OCCUPANCY = float(os.getenv("AUTO_RUNTIME_MAX_WARM_OCCUPANCY", "0.75"))
+STATS_WINDOW = RUNTIME_STATS_WINDOW
+
+def _expected_cost(runtime, stats):
+    # Cold starts on the warm pool cost as much as a fresh container
+    cold_start_rate = stats["cold_start_rate"] or 0
+    if runtime == "docker-warm":
+        return RUNTIME_COST[runtime] + cold_start_rate * (RUNTIME_COST["docker"] - RUNTIME_COST[runtime])
+    return RUNTIME_COST[runtime]
+
+def select_runtime(stats, latency_target_ms, warm_occupancy):
+    """Pick the cheapest runtime whose recent p95 meets the latency target.
+
+    stats maps runtime -> {samples, p95_ms, error_rate, cold_start_rate}
+    as returned by get_runtime_stats(). Returns (runtime, decision) where
+    decision records the inputs and the reason for offline evaluation.
+    """
+    available = [
+        runtime for runtime in RUNTIME_COST
+        if runtime != "docker-warm" or warm_occupancy < MAX_WARM_OCCUPANCY
+    ]
+    by_cost = sorted(available, key=lambda runtime: _expected_cost(runtime, stats[runtime]))
+
+    undersampled = [runtime for runtime in by_cost if stats[runtime]["samples"] < MIN_SAMPLES]
+    healthy = [runtime for runtime in by_cost
+               if runtime not in undersampled and stats[runtime]["error_rate"] <= MAX_ERROR_RATE]
+    meeting_target = [runtime for runtime in healthy if stats[runtime]["p95_ms"] <= latency_target_ms]
+
+    if undersampled:
+        # Not enough history yet: try the cheapest unknown runtime
+        runtime, reason = undersampled[0], "explore"
+    elif meeting_target:
+        runtime, reason = meeting_target[0], "cheapest_meeting_target"
+    elif healthy:
+        runtime, reason = min(healthy, key=lambda r: stats[r]["p95_ms"]), "fastest_missing_target"
+    else:
+        runtime, reason = min(by_cost, key=lambda r: stats[r]["error_rate"]), "least_errors"
+
+    decision = {
+        "policy": "auto",
+        "reason": reason,
+        "latency_target_ms": latency_target_ms,
+        "warm_occupancy": warm_occupancy,
+        "candidates": stats,
+    }
+    return runtime, decision
+
+def choose_runtime(function_name, warm_container, latency_target_ms=None):
+    stats = get_runtime_stats(function_name, list(RUNTIME_COST), STATS_WINDOW)
+    return select_runtime(
+        stats,
+        latency_target_ms or DEFAULT_LATENCY_TARGET_MS,
+        warm_pool_occupancy(warm_container),
+    )
@@ -0,0 +1,300 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from models.database import Session
+from models.function_model import FunctionMetadata as FunctionRecord
+from models.trigger_model import QueuedEvent, TriggerConfig
+from utils.cron import cron_matches
+from utils.execution_engine import run_function
+from utils.process_lock import process_lock
+
+TRIGGER_POLL_SECONDS = float(os.getenv("TRIGGER_POLL_SECONDS", "5"))
+# Threads shared by every trigger; each trigger is further capped by its
+# own max_parallelism
+TRIGGER_MAX_WORKERS = int(os.getenv("TRIGGER_MAX_WORKERS", "8"))
+# Queue events are retried this many times before being marked failed
+MAX_EVENT_ATTEMPTS = 3
+# Claims older than this belong to a worker that died mid-batch
+STALE_CLAIM_SECONDS = 600
+# Files from watched directories are moved here once dispatched
+PROCESSED_DIR = ".processed"
+FAILED_DIR = ".failed"
+PROCESSING_DIR = ".processing"
+# Largest file content passed to a function in an event
+MAX_FILE_EVENT_BYTES = 64 * 1024
+# Directory triggers may only watch directories under this root
+TRIGGER_WATCH_ROOT = os.getenv("TRIGGER_WATCH_ROOT", os.path.join(os.path.dirname(__file__), '../../watched'))
+
+# Missed schedule minutes (e.g. while the previous run was still going)
+# are fired late, up to this many per trigger
+MAX_SCHEDULE_CATCHUP_MINUTES = 60
+
+_executor = ThreadPoolExecutor(max_workers=TRIGGER_MAX_WORKERS, thread_name_prefix="trigger")
+# Trigger id -> invocations this process still has running (see
+# wait_for_triggers); TriggerConfig.running is the cross-process count
+_in_flight = {}
+_in_flight_changed = threading.Condition()
+
+def _succeeded(result):
+    return result.get("metrics", {}).get("status") == "ok"
+
+def _is_running(trigger, now):
+    # A count left behind by a worker that died expires like a stale claim
+    return bool(trigger.running) and trigger.running_since is not None and \
+        trigger.running_since > now - timedelta(seconds=STALE_CLAIM_SECONDS)
+
+def _release(trigger_id):
+    db = Session()
+    try:
+        db.query(TriggerConfig).filter(TriggerConfig.id == trigger_id, TriggerConfig.running > 0).update(
+            {"running": TriggerConfig.running - 1}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def _dispatch(db, function, trigger, now, jobs):
+    # jobs is a list of (events, on_done). Each is one invocation, run in
+    # the background; the function reads the batch from the JSON file named
+    # by LAMBDA_EVENTS_FILE, and on_done(ok) records the outcome.
+    # The running count is committed (with whatever the caller changed)
+    # before anything starts, so the next pass skips this trigger in any
+    # worker process.
+    trigger_id = trigger.id
+    runtime = trigger.runtime or function["runtime"] or "docker"
+    trigger.running = len(jobs)
+    trigger.running_since = now
+    db.commit()
+
+    def finish(future, on_done):
+        try:
+            on_done(future.exception() is None and _succeeded(future.result()))
+        except Exception as e:
+            print(f"[WARN] Trigger {trigger_id} for '{function['name']}' failed: {e}")
+        finally:
+            try:
+                _release(trigger_id)
+            except Exception as e:
+                print(f"[WARN] Could not release trigger {trigger_id}: {e}")
+            with _in_flight_changed:
+                _in_flight[trigger_id] -= 1
+                if not _in_flight[trigger_id]:
+                    del _in_flight[trigger_id]
+                _in_flight_changed.notify_all()
+
+    with _in_flight_changed:
+        _in_flight[trigger_id] = _in_flight.get(trigger_id, 0) + len(jobs)
+    for events, on_done in jobs:
+        future = _executor.submit(
+            run_function, function["name"], function["language"], function["code"], runtime,
+            timeout=function["timeout"], events=events,
+            latency_target_ms=function["latency_target_ms"]
+        )
+        future.add_done_callback(lambda future, on_done=on_done: finish(future, on_done))
+
+def wait_for_triggers(timeout=None):
+    """Block until every dispatched invocation has finished.
+
+    Returns False if some are still running after timeout seconds.
+    """
+    with _in_flight_changed:
+        return _in_flight_changed.wait_for(lambda: not _in_flight, timeout)
+
+def _chunk(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _due_minutes(trigger, now):
+    # Matching minutes since the last firing, oldest first
+    minute = now.replace(second=0, microsecond=0)
+    if trigger.last_fired_at is None:
+        earliest = minute
+    else:
+        earliest = max(trigger.last_fired_at + timedelta(minutes=1),
+                       minute - timedelta(minutes=MAX_SCHEDULE_CATCHUP_MINUTES - 1))
+    due = []
+    while earliest <= minute:
+        if cron_matches(trigger.schedule, earliest):
+            due.append(earliest)
+        earliest += timedelta(minutes=1)
+    return due
+
+def _fire_schedule(db, function, trigger, now):
+    # Oldest first, capped like the other kinds; the rest wait for a later pass
+    due = _due_minutes(trigger, now)[:trigger.batch_size * trigger.max_parallelism]
+    if not due:
+        return
+    trigger.last_fired_at = due[-1]
+    events = [{"source": "schedule", "time": minute.isoformat()} for minute in due]
+    _dispatch(db, function, trigger, now, [(batch, lambda ok: None) for batch in _chunk(events, trigger.batch_size)])
+
+def resolve_watch_path(path):
+    """Resolve path (relative ones against TRIGGER_WATCH_ROOT) following
+    symlinks. Returns None if the result lies outside the root."""
+    root = os.path.realpath(TRIGGER_WATCH_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        return None
+    return resolved
+
+def _recover_stale_files(directory):
+    # Files left in .processing by a worker that died mid-batch go back to
+    # the watched directory. Moving a file there updates its ctime.
+    processing_dir = os.path.join(directory, PROCESSING_DIR)
+    if not os.path.isdir(processing_dir):
+        return
+    cutoff = time.time() - STALE_CLAIM_SECONDS
+    for entry in os.scandir(processing_dir):
+        if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_ctime < cutoff:
+            os.replace(entry.path, os.path.join(directory, entry.name))
+
+def _move_file(directory, name, target):
+    target_dir = os.path.join(directory, target)
+    os.makedirs(target_dir, exist_ok=True)
+    os.replace(os.path.join(directory, PROCESSING_DIR, name), os.path.join(target_dir, name))
+
+def _fire_directory(db, function, trigger, now):
+    directory = resolve_watch_path(trigger.path)
+    if directory is None:
+        print(f"[WARN] Trigger {trigger.id} watches {trigger.path}, outside {TRIGGER_WATCH_ROOT}; skipped.")
+        return
+    if not os.path.isdir(directory):
+        return
+    _recover_stale_files(directory)
+    limit = trigger.batch_size * trigger.max_parallelism
+    # Symlinks are skipped so a link cannot expose files outside the root
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file(follow_symlinks=False)),
+        key=lambda entry: entry.stat().st_mtime
+    )[:limit]
+    if not entries:
+        return
+
+    # Move files aside first so a later tick never sees them twice
+    processing_dir = os.path.join(directory, PROCESSING_DIR)
+    os.makedirs(processing_dir, exist_ok=True)
+    events = []
+    for entry in entries:
+        claimed_path = os.path.join(processing_dir, entry.name)
+        os.replace(entry.path, claimed_path)
+        with open(claimed_path, "rb") as f:
+            content = f.read(MAX_FILE_EVENT_BYTES)
+        events.append({
+            "source": "file",
+            "name": entry.name,
+            "path": entry.path,
+            "content": content.decode("utf-8", errors="replace")
+        })
+
+    trigger.last_fired_at = now
+    jobs = []
+    for batch in _chunk(events, trigger.batch_size):
+        names = [event["name"] for event in batch]
+
+        def on_done(ok, names=names):
+            for name in names:
+                _move_file(directory, name, PROCESSED_DIR if ok else FAILED_DIR)
+
+        jobs.append((batch, on_done))
+    _dispatch(db, function, trigger, now, jobs)
+
+def _finish_queue_batch(event_ids, ok):
+    db = Session()
+    try:
+        events = db.query(QueuedEvent).filter(QueuedEvent.id.in_(event_ids))
+        if ok:
+            events.delete(synchronize_session=False)
+        else:
+            for event in events:
+                event.status = "failed" if event.attempts >= MAX_EVENT_ATTEMPTS else "pending"
+        db.commit()
+    finally:
+        db.close()
+
+def _fire_queue(db, function, trigger, now):
+    # Take back claims from a worker that died mid-batch
+    db.query(QueuedEvent).filter(
+        QueuedEvent.function_name == function["name"],
+        QueuedEvent.status == "claimed",
+        QueuedEvent.claimed_at < now - timedelta(seconds=STALE_CLAIM_SECONDS)
+    ).update({"status": "pending"}, synchronize_session=False)
+
+    limit = trigger.batch_size * trigger.max_parallelism
+    events = (
+        db.query(QueuedEvent)
+        .filter(QueuedEvent.function_name == function["name"], QueuedEvent.status == "pending")
+        .order_by(QueuedEvent.id)
+        .limit(limit)
+        .all()
+    )
+    if not events:
+        db.commit()
+        return
+    for event in events:
+        event.status = "claimed"
+        event.claimed_at = now
+        event.attempts = (event.attempts or 0) + 1
+    trigger.last_fired_at = now
+    jobs = [
+        ([json.loads(event.payload) for event in batch],
+         lambda ok, event_ids=[event.id for event in batch]: _finish_queue_batch(event_ids, ok))
+        for batch in _chunk(events, trigger.batch_size)
+    ]
+    _dispatch(db, function, trigger, now, jobs)
+
+FIRE = {
+    "schedule": _fire_schedule,
+    "directory": _fire_directory,
+    "queue": _fire_queue,
+}
+
+def run_triggers_once(now=None):
+    """Fire every enabled trigger that is due. Returns the triggers checked.
+
+    Invocations run in the background (see wait_for_triggers); a trigger
+    whose previous invocations are still running is skipped this pass.
+    """
+    db = Session()
+    try:
+        triggers = db.query(TriggerConfig).filter(TriggerConfig.enabled.is_(True)).all()
+        names = {trigger.function_name for trigger in triggers}
+        functions = {
+            record.name: record.to_dict(include_code=True)
+            for record in db.query(FunctionRecord).filter(FunctionRecord.name.in_(names))
+        }
+        for trigger in triggers:
+            function = functions.get(trigger.function_name)
+            if function is None or not function["code"]:
+                print(f"[WARN] Trigger {trigger.id} skipped: function '{trigger.function_name}' has no code.")
+                continue
+            # Firing one trigger can take a while; don't let the others
+            # work from a stale clock
+            trigger_now = now or datetime.now()
+            if _is_running(trigger, trigger_now):
+                continue
+            try:
+                FIRE[trigger.kind](db, function, trigger, trigger_now)
+            except Exception as e:
+                db.rollback()
+                print(f"[WARN] Trigger {trigger.id} for '{trigger.function_name}' failed: {e}")
+        return len(triggers)
+    finally:
+        db.close()
+
+def _trigger_loop():
+    while True:
+        # Only one worker process fires triggers at a time
+        with process_lock("triggers", blocking=False) as acquired:
+            if acquired:
+                try:
+                    run_triggers_once()
+                except Exception as e:
+                    print(f"[WARN] Trigger pass failed: {e}")
+        time.sleep(TRIGGER_POLL_SECONDS)
+
+def start_trigger_scheduler():
+    thread = threading.Thread(target=_trigger_loop, name="trigger-scheduler", daemon=True)
+    thread.start()
+    return thread
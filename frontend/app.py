@@ -24,50 +24,108 @@ API_BASE_URL = "http://localhost:8000"
 st.sidebar.title("Lambda Function Manager")
 page = st.sidebar.radio("Navigation", ["Functions", "Deploy Function", "Execute Function", "Monitoring Dashboard"])
 
+# Seconds a cached API response stays fresh between reruns
+FUNCTIONS_TTL_SECONDS = 10
+DETAILS_TTL_SECONDS = 30
+METRICS_TTL_SECONDS = 5
+# Points kept per function for the live monitoring charts
+MAX_METRIC_POINTS = 2000
+
+# One pooled HTTP session per Streamlit server process, reused across reruns
+@st.cache_resource
+def get_http_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def api_get(path, **params):
+    response = get_http_session().get(f"{API_BASE_URL}{path}", params=params or None, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+# Cached fetches; failures raise so they are not cached
+@st.cache_data(ttl=FUNCTIONS_TTL_SECONDS, show_spinner=False)
+def fetch_functions():
+    return api_get("/functions/list")
+
+@st.cache_data(ttl=DETAILS_TTL_SECONDS, show_spinner=False)
+def fetch_function_details(function_name):
+    return api_get(f"/functions/get/{function_name}")
+
+@st.cache_data(ttl=METRICS_TTL_SECONDS, show_spinner=False)
+def fetch_function_metrics(function_name):
+    return api_get(f"/functions/metrics/{function_name}")
+
+@st.cache_data(ttl=METRICS_TTL_SECONDS, show_spinner=False)
+def fetch_runtime_metrics(function_name):
+    return api_get(f"/functions/metrics/{function_name}/runtimes")
+
+@st.cache_data(ttl=METRICS_TTL_SECONDS, show_spinner=False)
+def fetch_metrics_storage():
+    return api_get("/functions/storage/metrics")
+
+def invalidate_function_cache():
+    fetch_functions.clear()
+    fetch_function_details.clear()
+
 # Helper functions for API calls
 def get_functions():
     try:
-        response = requests.get(f"{API_BASE_URL}/functions/list")
-        if response.status_code == 200:
-            # Make sure to return a dictionary, not a string
-            return response.json()
-        else:
-            st.error(f"Error: {response.status_code}")
-            return {}
+        # Make sure to return a dictionary, not a string
+        return fetch_functions()
+    except requests.exceptions.HTTPError as e:
+        st.error(f"Error: {e.response.status_code}")
+        return {}
     except requests.exceptions.RequestException as e:
         st.error(f"API connection error: {e}")
         return {}
 
 def get_function_details(function_name):
     try:
-        response = requests.get(f"{API_BASE_URL}/functions/get/{function_name}")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Error fetching function details: {response.status_code}")
-            return None
+        return fetch_function_details(function_name)
+    except requests.exceptions.HTTPError as e:
+        st.error(f"Error fetching function details: {e.response.status_code}")
+        return None
     except requests.exceptions.RequestException as e:
         st.error(f"API connection error: {e}")
         return None
 
 def get_function_metrics(function_name):
     try:
-        response = requests.get(f"{API_BASE_URL}/functions/metrics/{function_name}")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Error fetching metrics: {response.status_code}")
-            return None
+        return fetch_function_metrics(function_name)
+    except requests.exceptions.HTTPError as e:
+        st.error(f"Error fetching metrics: {e.response.status_code}")
+        return None
     except requests.exceptions.RequestException as e:
         st.error(f"API connection error: {e}")
         return None
 
+def get_metric_points(function_name):
+    # Seed with the newest points, then only ask for points newer than the
+    # last one we already hold
+    cache = st.session_state.setdefault("metric_points", {})
+    entry = cache.setdefault(function_name, {"cursor": None, "points": []})
+    try:
+        data = api_get(
+            f"/functions/metrics/{function_name}/points",
+            cursor=entry["cursor"], limit=MAX_METRIC_POINTS
+        )
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error fetching metric points: {e}")
+        return entry["points"]
+    entry["points"] = (entry["points"] + data["points"])[-MAX_METRIC_POINTS:]
+    entry["cursor"] = data["cursor"]
+    return entry["points"]
+
 # Function List Page
 if page == "Functions":
     st.title("Function Management")
     
     # Refresh button
     if st.button("Refresh Functions"):
+        invalidate_function_cache()
         st.experimental_rerun()
     
     functions = get_functions()
@@ -112,8 +170,9 @@ if page == "Functions":
         with col2:
             if st.button("Delete Function"):
                 try:
-                    response = requests.delete(f"{API_BASE_URL}/functions/delete/{selected_function}")
+                    response = get_http_session().delete(f"{API_BASE_URL}/functions/delete/{selected_function}")
                     if response.status_code == 200:
+                        invalidate_function_cache()
                         st.success(f"Function {selected_function} deleted successfully!")
                         time.sleep(1)  # Give user time to see the message
                         st.experimental_rerun()
@@ -154,17 +213,24 @@ elif page == "Deploy Function":
                                   index=0 if function_details.get("language") == "python" else 1)
             timeout = st.slider("Timeout (seconds)", min_value=1, max_value=300, 
                               value=function_details.get("timeout", 10))
+            code = st.text_area("Function Code (run by triggers)", value=function_details.get("code") or "", height=200)
+            latency_target_ms = st.number_input("Latency Target for auto runtime (ms, 0 = default)", min_value=0,
+                                                value=function_details.get("latency_target_ms") or 0)
             
             if st.button("Update Function"):
                 data = {
                     "name": name,
                     "route": route,
                     "language": language,
-                    "timeout": timeout
+                    "timeout": timeout,
+                    "runtime": function_details.get("runtime") or "docker",
+                    "code": code or None,
+                    "latency_target_ms": latency_target_ms or None
                 }
                 try:
-                    response = requests.put(f"{API_BASE_URL}/functions/update/{name}", json=data)
+                    response = get_http_session().put(f"{API_BASE_URL}/functions/update/{name}", json=data)
                     if response.status_code == 200:
+                        invalidate_function_cache()
                         st.success(f"Function {name} updated successfully!")
                     else:
                         st.error(f"Failed to update function: {response.status_code}")
@@ -179,6 +245,8 @@ elif page == "Deploy Function":
             route = st.text_input("Route (e.g., /hello)")
             language = st.selectbox("Language", ["python", "javascript"])
             timeout = st.slider("Timeout (seconds)", min_value=1, max_value=300, value=10)
+            code = st.text_area("Function Code (run by triggers)", height=200)
+            latency_target_ms = st.number_input("Latency Target for auto runtime (ms, 0 = default)", min_value=0, value=0)
             
             submitted = st.form_submit_button("Deploy Function")
             if submitted:
@@ -189,11 +257,14 @@ elif page == "Deploy Function":
                         "name": name,
                         "route": route,
                         "language": language,
-                        "timeout": timeout
+                        "timeout": timeout,
+                        "code": code or None,
+                        "latency_target_ms": latency_target_ms or None
                     }
                     try:
-                        response = requests.post(f"{API_BASE_URL}/functions/register", json=data)
+                        response = get_http_session().post(f"{API_BASE_URL}/functions/register", json=data)
                         if response.status_code == 200:
+                            invalidate_function_cache()
                             st.success(f"Function {name} deployed successfully!")
                         else:
                             st.error(f"Failed to deploy function: {response.status_code}")
@@ -204,7 +275,7 @@ elif page == "Deploy Function":
 elif page == "Execute Function":
     st.title("Execute Function")
     
-    runtime_options = ["docker", "docker-warm"]
+    runtime_options = ["auto", "docker", "docker-warm"]
     if "second_runtime" in st.session_state:
         runtime_options.append(st.session_state.second_runtime)
     
@@ -229,13 +300,15 @@ elif page == "Execute Function":
             try:
                 with st.spinner("Executing function..."):
                     start_time = time.time()
-                    response = requests.post(f"{API_BASE_URL}/functions/execute", json=execute_data)
+                    response = get_http_session().post(f"{API_BASE_URL}/functions/execute", json=execute_data)
                     execution_time = time.time() - start_time
                     
                     if response.status_code == 200:
                         result = response.json()
                         
                         st.subheader("Execution Results")
+                        if result.get("error"):
+                            st.error(result["error"])
                         st.text("Standard Output:")
                         st.code(result.get("stdout", ""))
                         
@@ -247,11 +320,14 @@ elif page == "Execute Function":
                         st.subheader("Execution Metrics")
                         metrics = result.get("metrics", {})
                         
-                        metric_cols = st.columns(4)
+                        metric_cols = st.columns(5)
                         metric_cols[0].metric("Duration (s)", f"{metrics.get('duration', 0):.4f}")
                         metric_cols[1].metric("API Latency (s)", f"{execution_time:.4f}")
                         metric_cols[2].metric("CPU (%)", metrics.get("cpu_percent", 0))
                         metric_cols[3].metric("Memory (MB)", metrics.get("memory_mb", 0))
+                        metric_cols[4].metric("Runtime", metrics.get("runtime") or runtime)
+                        if metrics.get("decision"):
+                            st.caption(f"Auto runtime: {metrics['decision']['reason']}")
                     else:
                         st.error(f"Execution failed: {response.status_code}")
                         st.text(response.text)
@@ -267,86 +343,137 @@ elif page == "Monitoring Dashboard":
     if not functions:
         st.info("No functions available to monitor.")
     else:
+        # Auto-refresh reruns the page; cached fetches keep reruns cheap
+        refresh_col1, refresh_col2 = st.columns([1, 3])
+        with refresh_col1:
+            st.checkbox("Auto-refresh", value=False, key="auto_refresh")
+        with refresh_col2:
+            st.slider("Refresh interval (seconds)", min_value=2, max_value=60, value=5, key="refresh_interval")
+
         # System-wide statistics
         st.header("System-wide Statistics")
-        
-        # Create placeholder data for demo if needed
-        # In a real implementation, you would fetch these from the API
-        
-        # Placeholder charts with mock data (replace with real data in production)
+
+        try:
+            storage = fetch_metrics_storage()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error fetching metrics storage: {e}")
+            storage = None
+
         col1, col2 = st.columns(2)
-        
+
         with col1:
-            # Invocations over time chart
-            st.subheader("Function Invocations")
-            
-            # Mock data for visualization - replace with real API data
-            dates = pd.date_range(start='2025-04-01', periods=14)
-            invocation_data = pd.DataFrame({
-                'date': dates,
-                'count': [12, 18, 25, 22, 30, 35, 28, 15, 20, 25, 40, 45, 30, 25]
-            })
-            
-            invocation_chart = alt.Chart(invocation_data).mark_line().encode(
-                x='date:T',
-                y='count:Q',
-                tooltip=['date:T', 'count:Q']
-            ).properties(height=300)
-            
-            st.altair_chart(invocation_chart, use_container_width=True)
-        
+            # Recent invocations per function (raw window, busiest first)
+            st.subheader("Recent Invocations by Function")
+
+            if storage and storage["functions"]:
+                invocation_data = pd.DataFrame([
+                    {"function": name, "count": counts["raw_rows"]}
+                    for name, counts in storage["functions"].items()
+                ]).nlargest(20, "count")
+
+                invocation_chart = alt.Chart(invocation_data).mark_bar().encode(
+                    x=alt.X('function:N', sort='-y'),
+                    y='count:Q',
+                    tooltip=['function:N', 'count:Q']
+                ).properties(height=300)
+
+                st.altair_chart(invocation_chart, use_container_width=True)
+            else:
+                st.info("No invocations recorded yet.")
+
         with col2:
-            # Average execution time chart
-            st.subheader("Average Execution Time")
-            
-            # Mock data for visualization - replace with real API data
-            execution_data = pd.DataFrame({
-                'date': dates,
-                'time': [0.8, 1.2, 0.9, 1.5, 1.3, 1.0, 0.7, 0.9, 1.1, 1.3, 1.5, 1.2, 1.0, 0.8]
-            })
-            
-            execution_chart = alt.Chart(execution_data).mark_line(color='orange').encode(
-                x='date:T',
-                y='time:Q',
-                tooltip=['date:T', 'time:Q']
-            ).properties(height=300)
-            
-            st.altair_chart(execution_chart, use_container_width=True)
-        
+            # Size of the metrics store
+            st.subheader("Metrics Store")
+
+            if storage:
+                st.metric("Database Size (MB)", f"{storage['db_size_bytes'] / (1024 * 1024):.2f}")
+                st.metric("Raw Rows", storage["raw_rows"])
+                st.metric("Rollup Rows", storage["rollup_rows"])
+
         # Individual function metrics
         st.header("Individual Function Metrics")
         selected_function = st.selectbox("Select Function", list(functions.keys()))
-        
+
         if selected_function:
             metrics = get_function_metrics(selected_function)
-            
+            points = get_metric_points(selected_function)
+
             if metrics:
-                col1, col2 = st.columns(2)
-                
+                col1, col2, col3 = st.columns(3)
+
                 with col1:
                     st.metric("Total Invocations", metrics.get("total_invocations", 0))
-                
+
                 with col2:
                     st.metric("Average Duration (seconds)", f"{metrics.get('average_duration') or 0.0:.4f}")
-                
-                # Performance comparison between runtimes - FIXED CHART
+
+                with col3:
+                    st.metric("Timeouts", metrics.get("total_timeouts", 0))
+
+                if points:
+                    # Bucket recent points per minute for the live charts
+                    points_df = pd.DataFrame(points)
+                    points_df["timestamp"] = pd.to_datetime(points_df["timestamp"])
+                    points_df["failed"] = points_df["error"].notna()
+                    per_minute = points_df.set_index("timestamp").resample("1min").agg(
+                        count=("duration", "size"),
+                        duration=("duration", "mean"),
+                        error=("failed", "sum")
+                    ).reset_index()
+                    per_minute["success"] = per_minute["count"] - per_minute["error"]
+
+                    col1, col2 = st.columns(2)
+
+                    with col1:
+                        st.subheader("Function Invocations")
+
+                        invocation_chart = alt.Chart(per_minute).mark_line().encode(
+                            x='timestamp:T',
+                            y='count:Q',
+                            tooltip=['timestamp:T', 'count:Q']
+                        ).properties(height=300)
+
+                        st.altair_chart(invocation_chart, use_container_width=True)
+
+                    with col2:
+                        st.subheader("Average Execution Time")
+
+                        execution_chart = alt.Chart(per_minute).mark_line(color='orange').encode(
+                            x='timestamp:T',
+                            y='duration:Q',
+                            tooltip=['timestamp:T', 'duration:Q']
+                        ).properties(height=300)
+
+                        st.altair_chart(execution_chart, use_container_width=True)
+                else:
+                    st.info("No recent invocations for this function.")
+
+                # Performance comparison between runtimes
                 st.subheader("Performance by Runtime")
-                
-                # Mock data for visualization - replace with real API data
+
+                try:
+                    runtime_metrics = fetch_runtime_metrics(selected_function)
+                except requests.exceptions.RequestException as e:
+                    st.error(f"Error fetching runtime metrics: {e}")
+                    runtime_metrics = {"runtimes": {}}
+
                 runtime_data = pd.DataFrame({
-                    'Runtime': ['docker', 'docker-warm', 'second-runtime'],
-                    'Average Duration (s)': [1.5, 0.3, 0.8],
-                    'Invocations': [50, 120, 30]
+                    'Runtime': list(runtime_metrics["runtimes"]),
+                    'p95 Duration (s)': [(r["p95_ms"] or 0) / 1000 for r in runtime_metrics["runtimes"].values()],
+                    'Invocations': [r["samples"] for r in runtime_metrics["runtimes"].values()]
                 })
+                if runtime_metrics.get("auto_choice"):
+                    st.caption(f"Auto runtime would pick **{runtime_metrics['auto_choice']}** "
+                               f"({runtime_metrics['decision']['reason']})")
                 
                 # Create a figure with secondary y-axis for better visualization
                 fig = go.Figure()
                 
-                # Add bars for average duration
+                # Add bars for p95 duration
                 fig.add_trace(go.Bar(
                     x=runtime_data['Runtime'],
-                    y=runtime_data['Average Duration (s)'],
-                    name='Avg Duration',
+                    y=runtime_data['p95 Duration (s)'],
+                    name='p95 Duration',
                     marker_color='indianred'
                 ))
                 
@@ -363,7 +490,7 @@ elif page == "Monitoring Dashboard":
                 fig.update_layout(
                     height=400,
                     yaxis=dict(
-                        title='Average Duration (s)',
+                        title='p95 Duration (s)',
                         side='left'
                     ),
                     yaxis2=dict(
@@ -386,34 +513,30 @@ elif page == "Monitoring Dashboard":
                 
                 # Error rate chart
                 st.subheader("Error Rate")
-                
-                # Mock data for visualization - replace with real API data
-                error_data = pd.DataFrame({
-                    'date': dates,
-                    'success': [95, 98, 92, 100, 97, 90, 100, 95, 98, 93, 97, 100, 95, 98],
-                    'error': [5, 2, 8, 0, 3, 10, 0, 5, 2, 7, 3, 0, 5, 2]
-                })
-                
-                # Convert to long format for stacked chart
-                error_long = pd.melt(
-                    error_data, 
-                    id_vars=['date'], 
-                    value_vars=['success', 'error'],
-                    var_name='status', 
-                    value_name='percentage'
-                )
-                
-                error_chart = alt.Chart(error_long).mark_area().encode(
-                    x='date:T',
-                    y=alt.Y('percentage:Q', stack='normalize'),
-                    color=alt.Color('status:N', scale=alt.Scale(
-                        domain=['success', 'error'],
-                        range=['green', 'red']
-                    )),
-                    tooltip=['date:T', 'status:N', 'percentage:Q']
-                ).properties(height=300)
-                
-                st.altair_chart(error_chart, use_container_width=True)
+
+                if points:
+                    error_data = per_minute[["timestamp", "success", "error"]].rename(columns={"timestamp": "date"})
+
+                    # Convert to long format for stacked chart
+                    error_long = pd.melt(
+                        error_data,
+                        id_vars=['date'],
+                        value_vars=['success', 'error'],
+                        var_name='status',
+                        value_name='count'
+                    )
+
+                    error_chart = alt.Chart(error_long).mark_area().encode(
+                        x='date:T',
+                        y=alt.Y('count:Q', stack='normalize', title='share'),
+                        color=alt.Color('status:N', scale=alt.Scale(
+                            domain=['success', 'error'],
+                            range=['green', 'red']
+                        )),
+                        tooltip=['date:T', 'status:N', 'count:Q']
+                    ).properties(height=300)
+
+                    st.altair_chart(error_chart, use_container_width=True)
         else:
             st.info("Select a function to view its metrics")
 
@@ -421,3 +544,8 @@ elif page == "Monitoring Dashboard":
 st.sidebar.markdown("---")
 st.sidebar.caption("Lambda Function Manager v1.0")
 st.sidebar.caption(f"Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+# Schedule the next dashboard refresh once everything has rendered
+if page == "Monitoring Dashboard" and st.session_state.get("auto_refresh"):
+    time.sleep(st.session_state.get("refresh_interval", 5))
+    st.experimental_rerun()